@@ -0,0 +1,184 @@
+from budget.changes import add_tombstones, next_change
+from budget.fingerprints import transaction_fingerprint
+from budget.models import Category as CategoryModel
+from budget.models import Month as MonthModel
+from budget.models import Transaction as TransactionModel
+from budget.rollups import RollupDelta
+
+
+UPDATE_FIELDS = ['amount', 'description', 'category', 'change_seq', 'fingerprint']
+
+
+def get_user_instances(model, user, ids):
+    '''Returns {str(id): instance} of user's instances with one id__in query'''
+    ids = {id for id in ids if id is not None}
+
+    if not ids:
+        return {}
+
+    return {str(pk): instance
+            for pk, instance in model.objects.filter(user=user).in_bulk(ids).items()}
+
+
+def get_existing_fingerprints(user, fingerprints, before_change=None):
+    '''
+    Returns fingerprints of user's transactions among given ones
+    with one fingerprint__in query. With before_change, rows written
+    by that change or later ones are not taken into account.
+    '''
+    fingerprints = set(fingerprints)
+
+    if not fingerprints:
+        return set()
+
+    transactions = TransactionModel.objects.filter(user=user, fingerprint__in=fingerprints)
+    if before_change is not None:
+        transactions = transactions.filter(change_seq__lt=before_change)
+
+    return set(transactions.values_list('fingerprint', flat=True).distinct())
+
+
+def bulk_create_with_ids(transactions, batch_size=1000):
+    '''
+    Creates transactions of one user and change with bulk_create and sets
+    their ids on every backend. Django 3.2 gets ids from INSERT ... RETURNING
+    on PostgreSQL only, elsewhere the newest rows of the change are read back.
+    Nothing else writes rows of the change, change counter of the user
+    stays locked until commit.
+    '''
+    transactions = TransactionModel.objects.bulk_create(transactions, batch_size=batch_size)
+
+    if transactions and transactions[0].pk is None:
+        first = transactions[0]
+        ids = (TransactionModel.objects
+               .filter(user_id=first.user_id, change_seq=first.change_seq)
+               .order_by('-id')
+               .values_list('id', flat=True)[:len(transactions)])
+
+        for transaction, id in zip(transactions, reversed(ids)):
+            transaction.pk = id
+
+    return transactions
+
+
+class TransactionActionsExecutor:
+    '''
+    Applies create/update/delete actions of one user as sets:
+    referenced rows are loaded with one id__in query per model,
+    changes are written with bulk_create, bulk_update and one delete.
+    Should be applied inside transaction.atomic().
+    '''
+
+    def __init__(self, user, actions):
+        self.user = user
+        self.actions = actions
+
+    def load(self):
+        datas = [action.get('data') or {} for action in self.actions]
+        writes = [(action.get('type'), data) for action, data in zip(self.actions, datas)
+                  if action.get('type') in ('update', 'delete')]
+
+        self.transactions = get_user_instances(
+            TransactionModel, self.user, [data.get('id') for _, data in writes])
+        self.categories = get_user_instances(
+            CategoryModel, self.user, [data.get('category') for data in datas])
+        self.months = get_user_instances(
+            MonthModel, self.user, [data.get('month') for data in datas])
+
+    def apply(self):
+        '''
+        Returns (results, errors). Results are in input order,
+        deleted transactions are None, failed actions are skipped.
+        Errors are (index, message) of failed actions.
+        Written transactions are kept in created, updated and deleted.
+        '''
+        self.load()
+
+        results = []
+        errors = []
+        created = []
+        updated = {}
+        deleted = set()
+        rollup = RollupDelta()
+        change = next_change(self.user)
+
+        for index, action in enumerate(self.actions):
+            type = action.get('type')
+            data = action.get('data') or {}
+
+            if type == 'create':
+                missing = [field for field in ('month', 'amount', 'group')
+                           if data.get(field) is None]
+                if missing:
+                    errors.append((index, 'Missing fields: %s.' % ', '.join(missing)))
+                    continue
+
+                month_instance = self.months.get(str(data['month']))
+                if month_instance is None:
+                    errors.append((index, 'Month not found.'))
+                    continue
+
+                transaction = TransactionModel(
+                    amount=data['amount'],
+                    description=data.get('description', ''),
+                    group=data['group'],
+                    category=self.categories.get(str(data.get('category'))),
+                    month=month_instance,
+                    user=self.user,
+                    change_seq=change,
+                )
+                transaction.fingerprint = transaction_fingerprint(transaction)
+                created.append(transaction)
+
+            elif type in ('update', 'delete'):
+                key = str(data.get('id'))
+                transaction = self.transactions.get(key)
+
+                if transaction is None or key in deleted:
+                    errors.append((index, 'Transaction not found.'))
+                    continue
+
+                if key not in updated:
+                    # old values leave the rollup once, new ones are added after write
+                    rollup.remove(transaction)
+
+                if type == 'update':
+                    if 'category' in data and str(data['category']) in self.categories:
+                        transaction.category = self.categories[str(data['category'])]
+                    if 'amount' in data:
+                        transaction.amount = data['amount']
+                    if 'description' in data:
+                        transaction.description = data['description']
+                    transaction.change_seq = change
+                    transaction.fingerprint = transaction_fingerprint(transaction)
+                    updated[key] = transaction
+
+                else:
+                    deleted.add(key)
+                    transaction = None
+
+            else:
+                errors.append((index, 'Unknown action.'))
+                continue
+
+            results.append(transaction)
+
+        bulk_create_with_ids(created)
+
+        updated = [transaction for key, transaction in updated.items()
+                   if key not in deleted]
+        TransactionModel.objects.bulk_update(updated, UPDATE_FIELDS, batch_size=1000)
+
+        if deleted:
+            add_tombstones(self.user, change, [self.transactions[key] for key in deleted])
+            TransactionModel.objects.filter(user=self.user, id__in=deleted).delete()
+
+        for transaction in created + updated:
+            rollup.add(transaction)
+        rollup.save()
+
+        self.created = created
+        self.updated = updated
+        self.deleted = [self.transactions[key] for key in deleted]
+
+        return results, errors
@@ -0,0 +1,41 @@
+from django.db import IntegrityError
+from django.db.models import F
+from django.db.transaction import atomic
+
+from budget.models import ChangeCounter, Tombstone
+
+
+def next_change(user):
+    '''
+    Returns next change sequence number of the user. Counter row stays
+    locked until commit, so changes of one user are committed in order
+    of their numbers. Should be called inside transaction.atomic().
+    '''
+    counters = ChangeCounter.objects.filter(user=user)
+
+    if not counters.update(value=F('value') + 1):
+        try:
+            with atomic():
+                ChangeCounter.objects.create(user=user, value=1)
+        except IntegrityError:
+            # row was created by concurrent request
+            counters.update(value=F('value') + 1)
+
+    return counters.values_list('value', flat=True).get()
+
+
+def last_change(user):
+    '''Returns number of last committed change of the user'''
+    return ChangeCounter.objects.filter(user=user).values_list('value', flat=True).first() or 0
+
+
+def add_tombstones(user, change, instances):
+    '''Records deletion of instances, should be called before delete'''
+    Tombstone.objects.bulk_create(
+        [Tombstone(user=user,
+                   model=instance._meta.model_name,
+                   object_id=instance.pk,
+                   change_seq=change)
+         for instance in instances],
+        batch_size=1000,
+    )
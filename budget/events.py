@@ -0,0 +1,28 @@
+from itertools import chain
+
+from django.db.transaction import on_commit
+
+from checkBalance import pubsub
+
+
+def publish_changes(user, created=(), updated=(), deleted=(), months=()):
+    '''
+    Publishes ids of changed transactions and months to subscriptions
+    of the user after the db transaction is committed.
+    Ids of deleted transactions should be taken before delete.
+    '''
+    message = {
+        'created': [str(transaction.pk) for transaction in created if transaction.pk is not None],
+        'updated': [str(transaction.pk) for transaction in updated],
+        'deleted': [str(transaction.pk) for transaction in deleted],
+        # month of transaction is null after the month is deleted
+        'months': sorted({str(month) for month in chain(
+            (transaction.month_id for transaction in chain(created, updated, deleted)), months)
+            if month is not None}),
+    }
+
+    if not any(message.values()):
+        return
+
+    user_id = user.pk
+    on_commit(lambda: pubsub.publish(user_id, message))
@@ -0,0 +1,105 @@
+import datetime
+
+from django.db import connection
+from django.db.transaction import atomic
+
+from budget.models import Category as CategoryModel
+from budget.models import Month as MonthModel
+from budget.models import Transaction as TransactionModel
+from budget.schema.pagination import DEFAULT_PAGE_SIZE
+from budget.schema.transactions import filter_transactions
+
+
+TRANSACTION_TABLE = TransactionModel._meta.db_table
+
+
+def hot_queries(user):
+    '''
+    Returns [(name, queryset, index name)] of transactions resolvers for every
+    filter with the index the query should be served by. Filter values are
+    taken from user's data when there is some.
+    '''
+    month = MonthModel.objects.filter(user=user).values_list('id', flat=True).first() or 0
+    category = CategoryModel.objects.filter(user=user).values_list('id', flat=True).first() or 0
+    created_at = (TransactionModel.objects.filter(user=user).values_list('created_at', flat=True).first()
+                  or datetime.date.today())
+
+    filters = [
+        ('month', {'month': month}, 'transaction_user_month_idx'),
+        ('category', {'category': category}, 'transaction_user_category_idx'),
+        ('createdAt', {'created_at': created_at}, 'transaction_user_created_idx'),
+        ('group', {'group': 'Expense'}, 'transaction_user_group_idx'),
+    ]
+
+    queries = []
+    for name, lookup, index in filters:
+        transactions = filter_transactions(user, **lookup)
+        queries.append(('transactions(%s)' % name, transactions, index))
+        # page of transactionsConnection
+        queries.append(('transactionsConnection(%s)' % name,
+                        transactions.order_by('created_at', 'id')[:DEFAULT_PAGE_SIZE + 1],
+                        index))
+
+    return queries
+
+
+@atomic
+def explain(queryset):
+    '''
+    Returns query plan of queryset. PostgreSQL plans it with sequential
+    scans disabled, so a Seq Scan means there is no usable index at all
+    and the result doesn't depend on the size of the tables.
+    '''
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    return queryset.explain()
+
+
+def scans_table(plan, table=TRANSACTION_TABLE):
+    '''Returns True if plan reads the whole table instead of using an index'''
+    for line in plan.splitlines():
+        # PostgreSQL: "Seq Scan on budget_transaction",
+        # SQLite: "SCAN budget_transaction" without "USING ... INDEX"
+        if 'Seq Scan on %s' % table in line:
+            return True
+
+        words = line.split()
+        if 'SCAN' in words:
+            rest = words[words.index('SCAN') + 1:]
+            if rest[:1] == [table] and 'INDEX' not in rest:
+                return True
+
+    return False
+
+
+def sorts(plan):
+    '''Returns True if rows are sorted after they are read instead of coming in index order'''
+    for line in plan.splitlines():
+        # PostgreSQL: "Sort" or "Incremental Sort" node, SQLite: "USE TEMP B-TREE FOR ORDER BY"
+        node = line.strip().lstrip('->').strip()
+        if node.startswith(('Sort ', 'Incremental Sort ')) or 'USE TEMP B-TREE' in line:
+            return True
+
+    return False
+
+
+def plan_problems(plan, index):
+    '''
+    Returns list of reasons why plan is not served by index alone:
+    full table scan, other index, sort step or intersection of
+    single column indexes (PostgreSQL BitmapAnd).
+    '''
+    problems = []
+
+    if scans_table(plan):
+        problems.append('sequential scan of %s' % TRANSACTION_TABLE)
+    if index not in plan:
+        problems.append('%s is not used' % index)
+    if sorts(plan):
+        problems.append('sort step')
+    if 'BitmapAnd' in plan:
+        problems.append('BitmapAnd of indexes')
+
+    return problems
@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+
+from django.conf import settings
+
+from budget.models import Transaction as TransactionModel
+from budget.schema.pagination import keyset_filter
+
+
+EXPORT_FIELDS = ['id', 'created_at', 'group', 'amount', 'description',
+                 'category__name', 'month__year', 'month__month']
+
+EXPORT_HEADER = ['id', 'date', 'group', 'amount', 'description',
+                 'category', 'year', 'month']
+
+EXPORT_ORDER = ('created_at', 'id')
+
+
+def fetch_chunk(user, after, size):
+    '''Returns next rows after (created_at, id) values with category and month joined'''
+    rows = TransactionModel.objects.filter(user=user)
+    if after is not None:
+        rows = rows.filter(keyset_filter(EXPORT_ORDER, after))
+    return list(rows.order_by(*EXPORT_ORDER).values_list(*EXPORT_FIELDS)[:size])
+
+
+def export_chunks(user):
+    '''
+    Yields lists of exported rows of the user. Every chunk is one keyset
+    query on (user, created_at, id) index, so rows are not held in memory
+    and queries don't depend on a cursor of one db connection. Under ASGI
+    chunks are fetched in thread pool, see checkBalance/handlers.py.
+    '''
+    size = settings.EXPORT_CHUNK_SIZE
+    after = None
+
+    while True:
+        rows = fetch_chunk(user, after, size)
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        after = rows[-1][1], rows[-1][0]
+
+
+def export_csv(user):
+    '''Yields CSV text, header first'''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(EXPORT_HEADER)
+    yield buffer.getvalue()
+
+    for rows in export_chunks(user):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def export_ndjson(user):
+    '''Yields one JSON object per line'''
+    for rows in export_chunks(user):
+        yield ''.join(json.dumps(dict(zip(EXPORT_HEADER, row)), default=str) + '\n'
+                      for row in rows)
+
+
+EXPORT_FORMATS = {
+    'csv': (export_csv, 'text/csv', 'transactions.csv'),
+    'ndjson': (export_ndjson, 'application/x-ndjson', 'transactions.ndjson'),
+}
@@ -0,0 +1,25 @@
+import hashlib
+import re
+
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_description(description):
+    return WHITESPACE.sub(' ', (description or '').strip().lower())
+
+
+def fingerprint(user_id, date, group, amount, description):
+    '''
+    Returns hash of fields identifying transaction of statement.
+    Same purchase imported twice or sent again by client gets
+    the same fingerprint.
+    '''
+    value = '|'.join([str(user_id), str(date), group, str(amount),
+                      normalize_description(description)])
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def transaction_fingerprint(transaction):
+    return fingerprint(transaction.user_id, transaction.created_at, transaction.group,
+                       transaction.amount, transaction.description)
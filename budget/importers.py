@@ -0,0 +1,351 @@
+import csv
+import datetime
+import io
+import re
+import time
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.transaction import atomic, on_commit
+
+from budget.actions import bulk_create_with_ids, get_existing_fingerprints
+from budget.changes import next_change
+from budget.events import publish_changes
+from budget.fingerprints import fingerprint
+from budget.models import Category as CategoryModel
+from budget.models import Month as MonthModel
+from budget.models import Transaction as TransactionModel
+from budget.rollups import RollupDelta
+from budget.upserts import insert_or_get
+from checkBalance.response_cache import bump_data_version
+
+
+DATE_FORMATS = ['%Y-%m-%d', '%Y%m%d', '%d.%m.%Y', '%m/%d/%Y', '%m/%d/%y']
+
+
+class RowError(ValueError):
+    '''Row of statement that can't be imported'''
+
+
+class StatementRow:
+    '''Transaction parsed from statement'''
+
+    def __init__(self, line, date, amount, description='', category=None):
+        self.line = line
+        self.date = date
+        self.amount = amount
+        self.description = description
+        self.category = category
+
+
+def parse_date(value):
+    # QIF writes years after 2000 as 1/5'21
+    value = value.strip().replace("'", '/').replace(' ', '')
+    for format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, format).date()
+        except ValueError:
+            pass
+    raise RowError('Invalid date: %s.' % value)
+
+
+def parse_amount(value):
+    '''Returns amount rounded to whole units, transactions store integers'''
+    try:
+        amount = Decimal(value.strip().replace(',', '').replace(' ', ''))
+    except InvalidOperation:
+        raise RowError('Invalid amount: %s.' % value)
+
+    if not amount.is_finite():
+        raise RowError('Invalid amount: %s.' % value)
+
+    return int(amount.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def row_or_error(line, parse):
+    try:
+        return parse()
+    except RowError as e:
+        return line, str(e)
+
+
+def parse_csv(lines):
+    '''
+    Yields StatementRow or (line, message) for each CSV row.
+    Header should have date and amount columns, description
+    and category are optional.
+    '''
+    reader = csv.DictReader(lines)
+
+    if reader.fieldnames is None:
+        return
+
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+
+    missing = {'date', 'amount'} - set(reader.fieldnames)
+    if missing:
+        yield 1, 'Missing columns: %s.' % ', '.join(sorted(missing))
+        return
+
+    for row in reader:
+        yield row_or_error(reader.line_num, lambda: StatementRow(
+            line=reader.line_num,
+            date=parse_date(row['date'] or ''),
+            amount=parse_amount(row['amount'] or ''),
+            description=(row.get('description') or '').strip(),
+            category=(row.get('category') or '').strip() or None,
+        ))
+
+
+def parse_qif(lines):
+    '''Yields StatementRow or (line, message) for each QIF record'''
+    record = {}
+    start = None
+
+    for number, line in enumerate(lines, start=1):
+        line = line.rstrip('\r\n')
+
+        if not line or line.startswith('!'):
+            continue
+
+        if start is None:
+            start = number
+
+        code, value = line[0], line[1:]
+
+        if code != '^':
+            record.setdefault(code, value)
+            continue
+
+        yield row_or_error(start, lambda: StatementRow(
+            line=start,
+            date=parse_date(record.get('D', '')),
+            amount=parse_amount(record.get('T') or record.get('U', '')),
+            description=' '.join(record[code].strip() for code in 'PM' if code in record),
+            category=record.get('L', '').strip() or None,
+        ))
+        record = {}
+        start = None
+
+
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def ofx_tags(chunks):
+    '''Yields (closing, name, value) of OFX tags reading text chunk by chunk'''
+    buffer = ''
+
+    for chunk in chunks:
+        buffer += chunk
+        end = buffer.rfind('<')
+        if end <= 0:
+            continue
+
+        for match in OFX_TAG.finditer(buffer, 0, end):
+            yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+        buffer = buffer[end:]
+
+    for match in OFX_TAG.finditer(buffer):
+        yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+
+
+def parse_ofx(chunks):
+    '''
+    Yields StatementRow or (number, message) for each STMTTRN of OFX,
+    number is position of transaction in statement.
+    Works for SGML (OFX 1.x) and XML (OFX 2.x) files.
+    '''
+    record = None
+    number = 0
+
+    for closing, name, value in ofx_tags(chunks):
+        if name == 'STMTTRN' and not closing:
+            record = {}
+            number += 1
+        elif name == 'STMTTRN' and record is not None:
+            yield row_or_error(number, lambda: StatementRow(
+                line=number,
+                # DTPOSTED is YYYYMMDDHHMMSS[.XXX][offset:TZ]
+                date=parse_date(record.get('DTPOSTED', '')[:8]),
+                amount=parse_amount(record.get('TRNAMT', '')),
+                description=' '.join(record[tag] for tag in ('NAME', 'MEMO') if record.get(tag)),
+            ))
+            record = None
+        elif record is not None and not closing and value:
+            record[name] = value
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'qif': parse_qif,
+    'ofx': parse_ofx,
+}
+
+
+def guess_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower()
+    return extension if extension in PARSERS else None
+
+
+def parse_statement(file, format):
+    '''Parses binary file object with parser of format, reading it piece by piece'''
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', errors='replace', newline='')
+
+    if format == 'ofx':
+        # OFX can be written in one line
+        return parse_ofx(iter(lambda: text.read(64 * 1024), ''))
+
+    return PARSERS[format](text)
+
+
+class TransactionImporter:
+    '''
+    Imports statement rows of one user in chunks. Every chunk is one
+    db transaction with one bulk_create, rollup and change sequence update.
+    Group comes from sign of amount, category is found by name
+    and month by (year, month) of the date, missing ones are created
+    and kept for the whole import.
+    Rows matching transactions imported before are duplicates, they are
+    rejected with skip_duplicates or imported and counted otherwise.
+    '''
+
+    def __init__(self, user, chunk_size=None, skip_duplicates=True):
+        self.user = user
+        self.chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+        self.skip_duplicates = skip_duplicates
+        self.first_change = None
+        self.duplicates = 0
+        self.categories = {}
+        self.months = None
+        self.rows = 0
+        self.imported = 0
+        self.rejects = []
+        self.rejected = 0
+        self.elapsed = 0
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.rejects) < settings.IMPORT_MAX_REJECTS:
+            self.rejects.append((line, message))
+
+    def get_month(self, date, change):
+        if self.months is None:
+            self.months = {(month.year, month.month): month
+                           for month in MonthModel.objects.filter(user=self.user)}
+
+        # months are numbered from 0
+        key = (date.year, date.month - 1)
+
+        if key not in self.months:
+            self.months[key], _ = insert_or_get(MonthModel(
+                user=self.user, year=date.year, month=date.month - 1, change_seq=change),
+                ['user', 'year', 'month'])
+
+        return self.months[key]
+
+    def get_category(self, name, change):
+        if name is None:
+            return None
+
+        if name not in self.categories:
+            category = CategoryModel.objects.filter(user=self.user, name=name).first()
+            if category is None:
+                category, _ = insert_or_get(CategoryModel(
+                    user=self.user, name=name, change_seq=change), ['user', 'name'])
+            self.categories[name] = category
+
+        return self.categories[name]
+
+    @atomic
+    def save_chunk(self, rows):
+        change = next_change(self.user)
+        if self.first_change is None:
+            self.first_change = change
+
+        valid = []
+        for row in rows:
+            if row.amount == 0:
+                self.reject(row.line, 'Amount is zero.')
+                continue
+
+            row.group = 'Expense' if row.amount < 0 else 'Income'
+            row.description = row.description[:100]
+            row.fingerprint = fingerprint(self.user.pk, row.date, row.group,
+                                          abs(row.amount), row.description)
+            valid.append(row)
+
+        # equal rows of this import are not duplicates of each other
+        existing = get_existing_fingerprints(
+            self.user, [row.fingerprint for row in valid], before_change=self.first_change)
+
+        transactions = []
+        for row in valid:
+            if row.fingerprint in existing:
+                self.duplicates += 1
+                if self.skip_duplicates:
+                    self.reject(row.line, 'Duplicate transaction.')
+                    continue
+
+            transactions.append(TransactionModel(
+                user=self.user,
+                created_at=row.date,
+                amount=abs(row.amount),
+                group=row.group,
+                description=row.description,
+                category=self.get_category(row.category[:50] if row.category else None, change),
+                month=self.get_month(row.date, change),
+                change_seq=change,
+                fingerprint=row.fingerprint,
+            ))
+
+        transactions = bulk_create_with_ids(transactions, self.chunk_size)
+
+        rollup = RollupDelta()
+        for transaction in transactions:
+            rollup.add(transaction)
+        rollup.save()
+
+        publish_changes(self.user, created=transactions)
+        user_id = self.user.pk
+        on_commit(lambda: bump_data_version(user_id))
+
+        self.imported += len(transactions)
+
+    def run(self, parsed):
+        '''Imports results of statement parser, returns self'''
+        started = time.monotonic()
+        chunk = []
+
+        try:
+            for result in parsed:
+                self.rows += 1
+
+                if isinstance(result, StatementRow):
+                    chunk.append(result)
+                else:
+                    self.reject(*result)
+
+                if len(chunk) >= self.chunk_size:
+                    self.save_chunk(chunk)
+                    chunk = []
+
+            if chunk:
+                self.save_chunk(chunk)
+        finally:
+            self.elapsed = time.monotonic() - started
+
+        return self
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.elapsed) if self.elapsed else self.rows
+
+    def report(self):
+        return {
+            'rows': self.rows,
+            'imported': self.imported,
+            'rejected': self.rejected,
+            'duplicates': self.duplicates,
+            'rowsPerSecond': self.rows_per_second,
+            'rejects': [{'line': line, 'message': message} for line, message in self.rejects],
+        }
@@ -0,0 +1,73 @@
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from budget.models import Category as CategoryModel
+from budget.models import Month as MonthModel
+from budget.models import Plan as PlanModel
+from budget.rollups import annotate_plan_spent
+
+
+class ModelLoader(DataLoader):
+    '''Loads model instances by id with one id__in query per batch'''
+    model = None
+
+    def batch_load_fn(self, keys):
+        # ids can come as strings when they were set from mutation args
+        instances = {str(pk): instance
+                     for pk, instance in self.model.objects.in_bulk(keys).items()}
+        return Promise.resolve([instances.get(str(key)) for key in keys])
+
+
+class CategoryLoader(ModelLoader):
+    model = CategoryModel
+
+
+class MonthLoader(ModelLoader):
+    model = MonthModel
+
+
+class PlanSpentLoader(DataLoader):
+    '''Loads expenses of plans by plan id'''
+
+    def batch_load_fn(self, keys):
+        spent = {str(plan['id']): plan['spent'] for plan in
+                 annotate_plan_spent(PlanModel.objects.filter(id__in=keys)).values('id', 'spent')}
+        return Promise.resolve([spent.get(str(key), 0) for key in keys])
+
+
+class Loaders:
+    '''DataLoaders of one request'''
+
+    def __init__(self):
+        self.category = CategoryLoader()
+        self.month = MonthLoader()
+        self.plan_spent = PlanSpentLoader()
+
+
+def get_loaders(context):
+    '''Returns loaders stored on request, creates them on first use'''
+    loaders = getattr(context, 'loaders', None)
+
+    if loaders is None:
+        loaders = Loaders()
+        context.loaders = loaders
+
+    return loaders
+
+
+def load_related(instance, field, info):
+    '''
+    Resolves foreign key of instance. Uses already joined object
+    if there is one, otherwise batches lookup with request loader.
+    '''
+    descriptor = getattr(type(instance), field)
+
+    if descriptor.is_cached(instance):
+        return getattr(instance, field)
+
+    related_id = getattr(instance, '%s_id' % field)
+
+    if related_id is None:
+        return None
+
+    return getattr(get_loaders(info.context), field).load(related_id)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from budget.explain import explain, hot_queries, plan_problems
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Prints query plans of transactions resolvers and checks that they use their indexes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of user whose data is used in filters.')
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(email=options['email'])
+        except CustomUser.DoesNotExist:
+            raise CommandError('User %s not found.' % options['email'])
+
+        failed = []
+        for name, queryset, index in hot_queries(user):
+            plan = explain(queryset)
+            problems = plan_problems(plan, index)
+
+            if problems:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR('%s: %s' % (name, ', '.join(problems))))
+            else:
+                self.stdout.write(self.style.SUCCESS('%s: %s' % (name, index)))
+            self.stdout.write(plan)
+            self.stdout.write('')
+
+        if failed:
+            raise CommandError('%s queries are not served by their indexes: %s.' % (
+                len(failed), ', '.join(failed)))
+
+        self.stdout.write(self.style.SUCCESS('All queries are served by their indexes.'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from budget.importers import PARSERS, TransactionImporter, guess_format, parse_statement
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Imports transactions of a user from CSV, OFX or QIF bank statement.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of user.')
+        parser.add_argument('path', help='Path to statement file.')
+        parser.add_argument('--format', choices=sorted(PARSERS),
+                            help='Statement format. Default is taken from file extension.')
+        parser.add_argument('--chunk-size', type=int,
+                            help='Rows inserted by one query.')
+        parser.add_argument('--keep-duplicates', action='store_true',
+                            help='Import rows matching existing transactions instead of skipping them.')
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(email=options['email'])
+        except CustomUser.DoesNotExist:
+            raise CommandError('User %s not found.' % options['email'])
+
+        format = options['format'] or guess_format(options['path'])
+        if format is None:
+            raise CommandError('Unknown format, use --format.')
+
+        try:
+            with open(options['path'], 'rb') as file:
+                importer = TransactionImporter(
+                    user, options['chunk_size'], not options['keep_duplicates'],
+                ).run(
+                    parse_statement(file, format))
+        except OSError as e:
+            raise CommandError(e)
+
+        for line, message in importer.rejects:
+            self.stdout.write('line %s: %s' % (line, message))
+
+        if importer.rejected > len(importer.rejects):
+            self.stdout.write('... and %s more rejected rows'
+                              % (importer.rejected - len(importer.rejects)))
+
+        self.stdout.write(self.style.SUCCESS(
+            'Imported %s of %s rows in %.2fs (%s rows/s), rejected %s, duplicates %s.' % (
+                importer.imported, importer.rows, importer.elapsed,
+                importer.rows_per_second, importer.rejected, importer.duplicates)))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from budget import rollups
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds transaction rollups from transactions or checks them for drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users',
+                            help='Email of user to process. Can be repeated. Default is all users.')
+        parser.add_argument('--check', action='store_true',
+                            help='Only report rollups that differ from transactions.')
+
+    def handle(self, *args, **options):
+        users = None
+        if options['users']:
+            users = CustomUser.objects.filter(email__in=options['users'])
+
+        if options['check']:
+            drift = rollups.find_drift(users)
+
+            for key, expected, stored in drift:
+                self.stdout.write('%s: expected %s, stored %s' % (key, expected, stored))
+
+            if drift:
+                raise CommandError('%s rollups differ from transactions.' % len(drift))
+
+            self.stdout.write(self.style.SUCCESS('Rollups match transactions.'))
+            return
+
+        count = rollups.rebuild(users)
+        self.stdout.write(self.style.SUCCESS('Rebuilt %s rollups.' % count))
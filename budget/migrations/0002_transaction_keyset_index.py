@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='color',
+            field=models.CharField(default='gray', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='transaction_user_created_idx'),
+        ),
+    ]
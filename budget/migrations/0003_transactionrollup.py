@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def fill_rollups(apps, schema_editor):
+    '''
+    Creates rollups of existing transactions with historical models,
+    rows with something else than a group choice in group are skipped.
+    '''
+    Transaction = apps.get_model('budget', 'Transaction')
+    TransactionRollup = apps.get_model('budget', 'TransactionRollup')
+
+    rows = (Transaction.objects
+            .filter(user__isnull=False, group__in=['Expense', 'Income', 'Savings'])
+            .values('user_id', 'month_id', 'category_id', 'group')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by())
+
+    TransactionRollup.objects.bulk_create([TransactionRollup(**row) for row in rows],
+                                          batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('budget', '0002_transaction_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.CharField(choices=[('Expense', 'Expense'), ('Income', 'Income'), ('Savings', 'Savings')], max_length=7)),
+                ('total', models.BigIntegerField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='budget.category')),
+                ('month', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='budget.month')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='transactionrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'month', 'category', 'group'), name='unique_transaction_rollup'),
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:38
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0004_change_tracking'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='created_at',
+            field=models.DateField(default=datetime.date.today),
+        ),
+    ]
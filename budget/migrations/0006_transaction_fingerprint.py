@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+from budget.fingerprints import transaction_fingerprint
+
+
+def fill_fingerprints(apps, schema_editor):
+    Transaction = apps.get_model('budget', 'Transaction')
+    transactions = Transaction.objects.filter(fingerprint='').order_by('id')
+    last_id = 0
+
+    while True:
+        chunk = list(transactions.filter(id__gt=last_id)[:1000])
+        if not chunk:
+            return
+
+        for transaction in chunk:
+            transaction.fingerprint = transaction_fingerprint(transaction)
+        Transaction.objects.bulk_update(chunk, ['fingerprint'])
+        last_id = chunk[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0005_transaction_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'fingerprint'], name='transaction_fingerprint_idx'),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+    ]
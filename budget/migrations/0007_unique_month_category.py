@@ -0,0 +1,83 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:46
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def next_change(ChangeCounter, user_id):
+    counter, _ = ChangeCounter.objects.get_or_create(user_id=user_id)
+    counter.value += 1
+    counter.save()
+    return counter.value
+
+
+def merge_duplicates(apps, schema_editor):
+    '''
+    Rows with the same (user, year, month) or (user, name) are merged
+    into the first one, their transactions and plans are moved to it
+    and rollups of touched users are recomputed.
+    '''
+    Category = apps.get_model('budget', 'Category')
+    Month = apps.get_model('budget', 'Month')
+    Transaction = apps.get_model('budget', 'Transaction')
+    Plan = apps.get_model('budget', 'Plan')
+    TransactionRollup = apps.get_model('budget', 'TransactionRollup')
+    ChangeCounter = apps.get_model('budget', 'ChangeCounter')
+    Tombstone = apps.get_model('budget', 'Tombstone')
+    users = set()
+
+    for model, fields, field in ((Month, ['user', 'year', 'month'], 'month'),
+                                 (Category, ['user', 'name'], 'category')):
+        duplicates = (model.objects
+                      .filter(user__isnull=False)
+                      .values(*fields)
+                      .annotate(count=Count('id'), keep=Min('id'))
+                      .filter(count__gt=1)
+                      .order_by())
+
+        for row in duplicates:
+            lookup = {name: row[name] for name in fields}
+            extra = list(model.objects.filter(**lookup).exclude(id=row['keep'])
+                         .values_list('id', flat=True))
+            change = next_change(ChangeCounter, row['user'])
+
+            for related in (Transaction, Plan):
+                related.objects.filter(**{'%s__in' % field: extra}).update(
+                    **{'%s_id' % field: row['keep'], 'change_seq': change})
+
+            Tombstone.objects.bulk_create([
+                Tombstone(user_id=row['user'], model=model._meta.model_name,
+                          object_id=pk, change_seq=change) for pk in extra])
+            model.objects.filter(id__in=extra).delete()
+            users.add(row['user'])
+
+    if not users:
+        return
+
+    TransactionRollup.objects.filter(user__in=users).delete()
+    rows = (Transaction.objects
+            .filter(user__in=users, group__in=['Expense', 'Income', 'Savings'])
+            .values('user_id', 'month_id', 'category_id', 'group')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by())
+    TransactionRollup.objects.bulk_create([TransactionRollup(**row) for row in rows],
+                                          batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0006_transaction_fingerprint'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='category',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_user_category_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='month',
+            constraint=models.UniqueConstraint(fields=('user', 'year', 'month'), name='unique_user_month'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0007_unique_month_category'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'month', 'created_at', 'id'], name='transaction_user_month_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('category__isnull', False)), fields=['user', 'category', 'created_at', 'id'], name='transaction_user_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'group', 'created_at', 'id'], name='transaction_user_group_idx'),
+        ),
+    ]
@@ -1,6 +1,9 @@
+import datetime
+
 from django.db import models
 from django.core.exceptions import ValidationError
 
+from budget.fingerprints import transaction_fingerprint
 from users.models import CustomUser
 
 
@@ -8,6 +11,15 @@ class Category(models.Model):
     user = models.ForeignKey(CustomUser, null=True, on_delete=models.CASCADE)
     name = models.CharField(max_length=50, blank=False)
     color = models.CharField(max_length=50, blank=False, default='gray')
+    change_seq = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_user_category_name'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'change_seq'], name='category_user_change_idx'),
+        ]
 
 
 class Month(models.Model):
@@ -16,6 +28,15 @@ class Month(models.Model):
     month = models.IntegerField(blank=False)
     start_month_savings = models.IntegerField(blank=True, null=True, default=0)
     start_month_balance = models.IntegerField(blank=True, null=True, default=0)
+    change_seq = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'year', 'month'], name='unique_user_month'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'change_seq'], name='month_user_change_idx'),
+        ]
 
     def validate_month(self, value):
         if value not in range(12):
@@ -30,13 +51,38 @@ class Transaction(models.Model):
     )
     user = models.ForeignKey(CustomUser, null=True, on_delete=models.CASCADE)
     group = models.CharField(blank=False, choices=GROUP_CHOICES, max_length=7)
-    created_at = models.DateField(auto_now_add=True)
+    # not auto_now_add, imported transactions keep date of statement
+    created_at = models.DateField(default=datetime.date.today)
     amount = models.IntegerField()
     description = models.CharField(null=True, blank=True, max_length=100)
     category = models.ForeignKey(
         Category, related_name='transactions', null=True, on_delete=models.SET_NULL)
     month = models.ForeignKey(
         Month, related_name='transactions', null=True, on_delete=models.SET_NULL)
+    change_seq = models.BigIntegerField(default=0)
+    # see budget/fingerprints.py, kept by save(), bulk writes set it explicitly
+    fingerprint = models.CharField(max_length=32, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # keyset pagination order for transactions connection
+            models.Index(fields=['user', 'created_at', 'id'],
+                         name='transaction_user_created_idx'),
+            # filters of transactions resolvers, ordered like the connection
+            models.Index(fields=['user', 'month', 'created_at', 'id'],
+                         name='transaction_user_month_idx'),
+            models.Index(fields=['user', 'category', 'created_at', 'id'],
+                         name='transaction_user_category_idx',
+                         condition=models.Q(category__isnull=False)),
+            models.Index(fields=['user', 'group', 'created_at', 'id'],
+                         name='transaction_user_group_idx'),
+            models.Index(fields=['user', 'change_seq'], name='transaction_user_change_idx'),
+            models.Index(fields=['user', 'fingerprint'], name='transaction_fingerprint_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.fingerprint = transaction_fingerprint(self)
+        super().save(*args, **kwargs)
 
 
 class Plan(models.Model):
@@ -46,3 +92,73 @@ class Plan(models.Model):
         Category, blank=False, related_name='plan', null=True, on_delete=models.SET_NULL)
     month = models.ForeignKey(
         Month, blank=False, related_name='plan', null=True, on_delete=models.SET_NULL)
+    change_seq = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'change_seq'], name='plan_user_change_idx'),
+        ]
+
+
+class TransactionRollup(models.Model):
+    '''
+    Sum and count of user's transactions per (month, category, group).
+    Kept up to date by transaction mutations, see budget/rollups.py
+    '''
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    month = models.ForeignKey(
+        Month, related_name='rollups', null=True, on_delete=models.CASCADE)
+    category = models.ForeignKey(
+        Category, related_name='rollups', null=True, on_delete=models.CASCADE)
+    group = models.CharField(choices=Transaction.GROUP_CHOICES, max_length=7)
+    total = models.BigIntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month', 'category', 'group'],
+                                    name='unique_transaction_rollup'),
+        ]
+
+
+class ChangeCounter(models.Model):
+    '''
+    Last change sequence number of user. Rows of synced models
+    keep number of their last change in change_seq, see budget/changes.py
+    '''
+    user = models.OneToOneField(CustomUser, primary_key=True, on_delete=models.CASCADE)
+    value = models.BigIntegerField(default=0)
+
+
+class Tombstone(models.Model):
+    '''Deleted row of synced model'''
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'change_seq'], name='tombstone_user_change_idx'),
+        ]
+
+
+class IdempotentRequest(models.Model):
+    '''
+    Stored response of mutation executed with idempotency key.
+    Row is committed together with changes of the mutation,
+    see checkBalance/idempotency.py
+    '''
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    key = models.CharField(max_length=64)  # sha256 of the key sent by client
+    request_hash = models.CharField(max_length=64)
+    response = models.TextField(default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_user_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='idempotency_user_created_idx'),
+        ]
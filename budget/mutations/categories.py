@@ -1,8 +1,18 @@
 import graphene
+from django.db import IntegrityError
+from django.db.transaction import atomic
 from graphql import GraphQLError
 
+from budget.changes import add_tombstones, next_change
 from budget.models import Category as CategoryModel
+from budget.models import Plan as PlanModel
+from budget.models import Transaction as TransactionModel
+from budget.events import publish_changes
+from budget.rollups import move_category_to_uncategorized
 from budget.schema.categories import Category
+from budget.upserts import insert_or_get
+from checkBalance.idempotency import IdempotencyKey, takes_idempotency_key
+from checkBalance.response_cache import bumps_data_version
 
 
 class CreateCategory(graphene.Mutation):
@@ -13,28 +23,32 @@ class CreateCategory(graphene.Mutation):
     class Arguments:
         name = graphene.String(required=True)
         color = graphene.String()
+        idempotency_key = IdempotencyKey()
 
     Output = Category
 
     @staticmethod
+    @takes_idempotency_key
+    @bumps_data_version
+    @atomic
     def mutate(self, info, name, color='gray'):
         user = info.context.user
 
         if user.is_anonymous:
             raise GraphQLError('Unauthorized.')
 
-        try:
-            category = CategoryModel.objects.get(name=name,
-                                                 user=user)
+        # existing name is found with one index lookup, without taking a change number
+        if CategoryModel.objects.filter(name=name, user=user).exists():
+            return None
 
-        except CategoryModel.DoesNotExist:
-            category = CategoryModel(
-                name=name,
-                color=color,
-                user=user,
-            )
-            category.save()
-            return category
+        category, created = insert_or_get(CategoryModel(
+            name=name,
+            color=color,
+            user=user,
+            change_seq=next_change(user),
+        ), ['user', 'name'])
+
+        return category if created else None
 
 
 class UpdateCategory(graphene.Mutation):
@@ -43,10 +57,14 @@ class UpdateCategory(graphene.Mutation):
         id = graphene.ID(required=True)
         name = graphene.String()
         color = graphene.String()
+        idempotency_key = IdempotencyKey()
 
     Output = Category
 
     @staticmethod
+    @takes_idempotency_key
+    @bumps_data_version
+    @atomic
     def mutate(self, info, id, name=None, color=None):
         user = info.context.user
 
@@ -68,7 +86,14 @@ class UpdateCategory(graphene.Mutation):
         if color is not None:
             category.color = color
 
-        category.save()
+        category.change_seq = next_change(user)
+
+        try:
+            # savepoint, the name can be taken by concurrent request after the lookup
+            with atomic():
+                category.save()
+        except IntegrityError:
+            return None
 
         return category
 
@@ -78,9 +103,13 @@ class DeleteCategory(graphene.Mutation):
 
     class Arguments:
         id = graphene.ID(required=True)
+        idempotency_key = IdempotencyKey()
 
     Output = Category
 
+    @takes_idempotency_key
+    @bumps_data_version
+    @atomic
     def mutate(self, info, id):
 
         user = info.context.user
@@ -90,10 +119,21 @@ class DeleteCategory(graphene.Mutation):
 
         try:
             category = CategoryModel.objects.get(id=id, user=user)
-            category.delete()
         except CategoryModel.DoesNotExist:
             return None
 
+        # counter row of user is locked before rollup rows, as in other mutations
+        change = next_change(user)
+        months = move_category_to_uncategorized(category)
+
+        # transactions and plans of category become uncategorized
+        TransactionModel.objects.filter(category=category).update(change_seq=change)
+        PlanModel.objects.filter(category=category).update(change_seq=change)
+        add_tombstones(user, change, [category])
+        category.delete()
+
+        publish_changes(user, months=months)
+
         return None
 
 
@@ -1,8 +1,14 @@
 import graphene
+from django.db.transaction import atomic
 from graphql import GraphQLError
 
+from budget.changes import next_change
+from budget.events import publish_changes
 from budget.models import Month as MonthModel
 from budget.schema.months import Month
+from budget.upserts import insert_or_get
+from checkBalance.idempotency import IdempotencyKey, takes_idempotency_key
+from checkBalance.response_cache import bumps_data_version
 
 
 class CreateMonth(graphene.Mutation):
@@ -17,10 +23,14 @@ class CreateMonth(graphene.Mutation):
         month = graphene.Int(required=True)
         start_month_savings = graphene.Int()
         start_month_balance = graphene.Int()
+        idempotency_key = IdempotencyKey()
 
     Output = Month
 
     @staticmethod
+    @takes_idempotency_key
+    @bumps_data_version
+    @atomic
     def mutate(self, info, year, month, start_month_savings=0, start_month_balance=0):
 
         user = info.context.user
@@ -28,21 +38,21 @@ class CreateMonth(graphene.Mutation):
         if user.is_anonymous:
             raise GraphQLError('Unauthorized.')
 
-        try:
-            month_instance = MonthModel.objects.get(
-                year=year, month=month, user=user)
+        month_instance = MonthModel.objects.filter(
+            year=year, month=month, user=user).first()
 
-        except MonthModel.DoesNotExist:
+        if month_instance is None:
             month_instance = MonthModel(
                 year=year,
                 month=month,
                 start_month_balance=start_month_balance,
                 start_month_savings=start_month_savings,
-                user=user
+                user=user,
+                change_seq=next_change(user),
             )
 
             month_instance.validate_month(month)
-            month_instance.save()
+            month_instance, _ = insert_or_get(month_instance, ['user', 'year', 'month'])
 
         return month_instance
 
@@ -53,10 +63,14 @@ class UpdateMonth(graphene.Mutation):
         id = graphene.ID(required=True)
         start_month_savings = graphene.Int()
         start_month_balance = graphene.Int()
+        idempotency_key = IdempotencyKey()
 
     Output = Month
 
     @staticmethod
+    @takes_idempotency_key
+    @bumps_data_version
+    @atomic
     def mutate(self, info, id, start_month_savings=None, start_month_balance=None):
         user = info.context.user
 
@@ -72,7 +86,11 @@ class UpdateMonth(graphene.Mutation):
             month_instance.start_month_savings = start_month_savings
         if start_month_balance is not None:
             month_instance.start_month_balance = start_month_balance
+        month_instance.change_seq = next_change(user)
         month_instance.save()
+
+        publish_changes(user, months=[month_instance.pk])
+
         return month_instance
 
 
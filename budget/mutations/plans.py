@@ -1,10 +1,14 @@
 import graphene
+from django.db.transaction import atomic
 from graphql import GraphQLError
 
+from budget.changes import next_change
 from budget.models import Category as CategoryModel
 from budget.models import Month as MonthModel
 from budget.models import Plan as PlanModel
 from budget.schema.plans import Plan
+from checkBalance.idempotency import IdempotencyKey, takes_idempotency_key
+from checkBalance.response_cache import bumps_data_version
 
 
 class CreatePlan(graphene.Mutation):
@@ -12,10 +16,14 @@ class CreatePlan(graphene.Mutation):
         category = graphene.ID(required=True)
         month = graphene.ID(required=True)
         planned_amount = graphene.Int(required=True)
+        idempotency_key = IdempotencyKey()
 
     Output = Plan
 
     @staticmethod
+    @takes_idempotency_key
+    @bumps_data_version
+    @atomic
     def mutate(self, info, category, month, planned_amount):
         user = info.context.user
 
@@ -38,6 +46,7 @@ class CreatePlan(graphene.Mutation):
             user=user,
             category=category_instance,
             month=month_instance,
+            change_seq=next_change(user),
         )
         plan.save()
 
@@ -48,10 +57,14 @@ class UpdatePlan(graphene.Mutation):
     class Arguments:
         id = graphene.ID(required=True)
         planned_amount = graphene.Int(required=True)
+        idempotency_key = IdempotencyKey()
 
     Output = Plan
 
     @staticmethod
+    @takes_idempotency_key
+    @bumps_data_version
+    @atomic
     def mutate(self, info, id, planned_amount):
         user = info.context.user
 
@@ -64,6 +77,7 @@ class UpdatePlan(graphene.Mutation):
             return None
 
         plan.planned_amount = planned_amount
+        plan.change_seq = next_change(user)
         plan.save()
         return plan
 
@@ -1,11 +1,20 @@
 import graphene
+from django.db.transaction import atomic
 from graphql import GraphQLError
 from graphql_auth.bases import Output
 
 from budget.models import Transaction as TransactionModel
 from budget.models import Category as CategoryModel
 from budget.models import Month as MonthModel
+from budget.actions import (TransactionActionsExecutor, bulk_create_with_ids,
+                            get_existing_fingerprints, get_user_instances)
+from budget.changes import add_tombstones, next_change
+from budget.events import publish_changes
+from budget.fingerprints import transaction_fingerprint
+from budget.rollups import RollupDelta
 from budget.schema.transactions import Transaction, TransactionGroups
+from checkBalance.idempotency import IdempotencyKey, takes_idempotency_key
+from checkBalance.response_cache import bumps_data_version
 
 
 class CreateTransaction(graphene.Mutation):
@@ -15,10 +24,14 @@ class CreateTransaction(graphene.Mutation):
         category = graphene.ID()
         month = graphene.ID(required=True)
         group = TransactionGroups(required=True)
+        idempotency_key = IdempotencyKey()
 
     Output = Transaction
 
     @staticmethod
+    @takes_idempotency_key
+    @bumps_data_version
+    @atomic
     def mutate(self, info, amount, group, month, category=None, description=None):
         user = info.context.user
 
@@ -43,9 +56,16 @@ class CreateTransaction(graphene.Mutation):
             category=category_instance,
             month=month_instance,
             group=group,
+            change_seq=next_change(user),
         )
         transaction.save()
 
+        rollup = RollupDelta()
+        rollup.add(transaction)
+        rollup.save()
+
+        publish_changes(user, created=[transaction])
+
         return transaction
 
 
@@ -62,54 +82,109 @@ class TransactionInput(graphene.InputObjectType):
     group = TransactionGroups()
 
 
+class TransactionError(graphene.ObjectType):
+    '''Error of one item of bulk mutation'''
+    index = graphene.Int(description='Position of the item in the input list')
+    message = graphene.String()
+
+
+class DuplicateAction(graphene.Enum):
+    '''What to do with items matching existing transactions'''
+    SKIP = 'skip'
+    FLAG = 'flag'
+
+
 class CreateTransactions(graphene.Mutation):
-    '''Creates bulk of transactions'''
+    '''
+    Creates bulk of transactions with one insert.
+    Category is set to null if not found.
+    Items without month, amount or group are not created and reported in errors.
+    Items with the same date, group, amount and description as existing
+    transactions are created and reported in duplicates, repeated purchases
+    look the same. Retries should use SKIP, then such items are not created
+    and are reported in skipped too.
+    '''
     transactions = graphene.List(lambda: Transaction)
+    errors = graphene.List(TransactionError)
+    duplicates = graphene.List(graphene.Int,
+                               description='Positions of items matching existing transactions')
+    skipped = graphene.List(graphene.Int,
+                            description='Positions of duplicates not created with SKIP')
 
     class Input:
         transactions = graphene.List(TransactionInput)
+        on_duplicate = DuplicateAction(default_value='flag')
+        idempotency_key = IdempotencyKey()
 
     @ staticmethod
+    @takes_idempotency_key
+    @bumps_data_version
+    @atomic
     def mutate(self, info, **kwargs):
         user = info.context.user
 
         if user.is_anonymous:
             raise GraphQLError('Unauthorized.')
 
-        transactions = []
-
-        for transaction in kwargs.get('transactions'):
+        items = kwargs.get('transactions') or []
 
-            if 'category' not in transaction:
-                transaction['category'] = None
+        categories = get_user_instances(
+            CategoryModel, user, [item.get('category') for item in items])
+        months = get_user_instances(
+            MonthModel, user, [item.get('month') for item in items])
 
-            try:
-                category_instance = CategoryModel.objects.get(
-                    id=transaction['category'], user=user)
-            except CategoryModel.DoesNotExist:
-                category_instance = None
-
-            try:
-                month_instance = MonthModel.objects.get(
-                    id=transaction['month'], user=user)
-            except MonthModel.DoesNotExist:
+        transactions = []
+        positions = []
+        errors = []
+        change = next_change(user)
+
+        for index, item in enumerate(items):
+            missing = [field for field in ('month', 'amount', 'group')
+                       if item.get(field) is None]
+            if missing:
+                errors.append(TransactionError(
+                    index=index, message='Missing fields: %s.' % ', '.join(missing)))
                 continue
 
-            if 'description' not in transaction:
-                transaction['description'] = ''
+            month_instance = months.get(str(item['month']))
+            if month_instance is None:
+                errors.append(TransactionError(index=index, message='Month not found.'))
+                continue
 
-            transaction = TransactionModel.objects.create(
-                amount=transaction['amount'],
-                description=transaction['description'],
-                category=category_instance,
+            transactions.append(TransactionModel(
+                amount=item['amount'],
+                description=item.get('description', ''),
+                category=categories.get(str(item.get('category'))),
                 month=month_instance,
-                group=transaction['description'],
+                group=item['group'],
                 user=user,
-            )
+                change_seq=change,
+            ))
+            transactions[-1].fingerprint = transaction_fingerprint(transactions[-1])
+            positions.append(index)
+
+        existing = get_existing_fingerprints(
+            user, [transaction.fingerprint for transaction in transactions])
+        duplicates = [index for index, transaction in zip(positions, transactions)
+                      if transaction.fingerprint in existing]
+
+        skipped = []
+        if kwargs.get('on_duplicate', 'flag') == 'skip':
+            skipped = duplicates
+            transactions = [transaction for transaction in transactions
+                            if transaction.fingerprint not in existing]
 
-            transactions.append(transaction)
+        transactions = bulk_create_with_ids(transactions)
 
-        return CreateTransactions(transactions=transactions)
+        rollup = RollupDelta()
+        for transaction in transactions:
+            rollup.add(transaction)
+        rollup.save()
+
+        publish_changes(user, created=transactions)
+
+        return CreateTransactions(transactions=transactions, errors=errors,
+                                  duplicates=duplicates, skipped=skipped)
 
 
 class UpdateTransaction(graphene.Mutation):
@@ -120,10 +195,14 @@ class UpdateTransaction(graphene.Mutation):
         amount = graphene.Int()
         description = graphene.String()
         category = graphene.ID()
+        idempotency_key = IdempotencyKey()
 
     Output = Transaction
 
     @staticmethod
+    @takes_idempotency_key
+    @bumps_data_version
+    @atomic
     def mutate(self, info, id, amount=None, description=None, category=None):
 
         user = info.context.user
@@ -136,6 +215,9 @@ class UpdateTransaction(graphene.Mutation):
         except TransactionModel.DoesNotExist:
             return None
 
+        rollup = RollupDelta()
+        rollup.remove(transaction)
+
         if category is not None:
             try:
                 category_instance = CategoryModel.objects.get(
@@ -149,8 +231,14 @@ class UpdateTransaction(graphene.Mutation):
         if description is not None:
             transaction.description = description
 
+        transaction.change_seq = next_change(user)
         transaction.save()
 
+        rollup.add(transaction)
+        rollup.save()
+
+        publish_changes(user, updated=[transaction])
+
         return transaction
 
 
@@ -158,10 +246,14 @@ class DeleteTransaction(graphene.Mutation):
     '''Deletes transaction with given ID'''
     class Arguments:
         id = graphene.ID(required=True)
+        idempotency_key = IdempotencyKey()
 
     Output = Transaction
 
     @staticmethod
+    @takes_idempotency_key
+    @bumps_data_version
+    @atomic
     def mutate(self, info, id):
         user = info.context.user
 
@@ -170,10 +262,19 @@ class DeleteTransaction(graphene.Mutation):
 
         try:
             transaction = TransactionModel.objects.get(id=id, user=user)
-            transaction.delete()
         except TransactionModel.DoesNotExist:
             return None
 
+        # counter row of user is locked before rollup rows, as in other mutations
+        change = next_change(user)
+
+        rollup = RollupDelta()
+        rollup.remove(transaction)
+        rollup.save()
+        publish_changes(user, deleted=[transaction])
+        add_tombstones(user, change, [transaction])
+        transaction.delete()
+
         return None
 
 
@@ -190,13 +291,22 @@ class ActionInput(graphene.InputObjectType):
 
 
 class ApplyTransactionsUpdates(graphene.Mutation):
-    '''Takes multiple actions in one request'''
+    '''
+    Takes multiple actions in one request.
+    Actions are applied together, results come in the order of actions.
+    Failed actions are skipped and reported in errors.
+    '''
     transactions = graphene.List(lambda: Transaction)
+    errors = graphene.List(TransactionError)
 
     class Input:
         actions = graphene.List(ActionInput)
+        idempotency_key = IdempotencyKey()
 
     @staticmethod
+    @takes_idempotency_key
+    @bumps_data_version
+    @atomic
     def mutate(self, info, **kwargs):
 
         user = info.context.user
@@ -204,77 +314,16 @@ class ApplyTransactionsUpdates(graphene.Mutation):
         if user.is_anonymous:
             raise GraphQLError('Unauthorized.')
 
-        transactions = []
+        executor = TransactionActionsExecutor(user, kwargs.get('actions') or [])
+        transactions, errors = executor.apply()
+
+        publish_changes(user, created=executor.created,
+                        updated=executor.updated, deleted=executor.deleted)
 
-        for action in kwargs.get('actions'):
-            type = action['type']
-            data = action['data']
-
-            if type == 'create':
-                if 'category' not in data:
-                    data['category'] = None
-
-                if 'month' not in data or 'amount' not in data or 'group' not in data:
-                    continue
-
-                try:
-                    category_instance = CategoryModel.objects.get(
-                        id=data['category'], user=user)
-                except CategoryModel.DoesNotExist:
-                    category_instance = None
-
-                try:
-                    month_instance = MonthModel.objects.get(
-                        id=data['month'], user=user)
-                except MonthModel.DoesNotExist:
-                    continue
-
-                if 'description' not in data:
-                    data['description'] = ''
-
-                transaction = TransactionModel.objects.create(
-                    amount=data['amount'],
-                    description=data['description'],
-                    group=data['group'],
-                    category=category_instance,
-                    month=month_instance,
-                    user=user
-                )
-
-            if type == 'update':
-
-                try:
-                    transaction = TransactionModel.objects.get(id=data['id'])
-                except TransactionModel.DoesNotExist:
-                    continue
-
-                if 'category' in data:
-                    try:
-                        category_instance = CategoryModel.objects.get(
-                            id=data['category'], user=user)
-                        transaction.category_id = data['category']
-                    except CategoryModel.DoesNotExist:
-                        pass
-
-                if 'amount' in data:
-                    transaction.amount = data['amount']
-                if 'description' in data:
-                    transaction.description = data['description']
-
-                transaction.save()
-
-            if type == 'delete':
-                try:
-                    transaction = TransactionModel.objects.get(
-                        id=data['id'], user=user)
-                    transaction.delete()
-                    transaction = None
-                except TransactionModel.DoesNotExist:
-                    continue
-
-            transactions.append(transaction)
-
-        return ApplyTransactionsUpdates(transactions=transactions)
+        return ApplyTransactionsUpdates(
+            transactions=transactions,
+            errors=[TransactionError(index=index, message=message)
+                    for index, message in errors])
 
 
 class Mutation(graphene.ObjectType):
@@ -0,0 +1,157 @@
+from collections import defaultdict
+
+from django.db import IntegrityError
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.transaction import atomic
+
+from budget.models import Transaction as TransactionModel
+from budget.models import TransactionRollup
+
+
+# rows stored before group was validated can hold any text in group,
+# they are not counted in rollups
+GROUPS = [group for group, _ in TransactionModel.GROUP_CHOICES]
+
+
+def rollup_key(transaction):
+    return (transaction.user_id,
+            transaction.month_id,
+            transaction.category_id,
+            transaction.group)
+
+
+def key_lookup(key):
+    user_id, month_id, category_id, group = key
+    return {
+        'user_id': user_id,
+        'month_id': month_id,
+        'category_id': category_id,
+        'group': group,
+    }
+
+
+class RollupDelta:
+    '''
+    Collects transaction changes and writes them to the rollup table
+    with one update per touched (user, month, category, group).
+    Should be saved inside the same db transaction as the changes.
+    '''
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: [0, 0])
+
+    def change(self, key, total, count):
+        delta = self.deltas[key]
+        delta[0] += total
+        delta[1] += count
+
+    def add(self, transaction, sign=1):
+        if transaction.group not in GROUPS:
+            return
+        self.change(rollup_key(transaction), sign * transaction.amount, sign)
+
+    def remove(self, transaction):
+        self.add(transaction, sign=-1)
+
+    def save(self):
+        for key, (total, count) in self.deltas.items():
+            if total or count:
+                apply_delta(key, total, count)
+        self.deltas.clear()
+
+
+def apply_delta(key, total, count):
+    lookup = key_lookup(key)
+    rollups = TransactionRollup.objects.filter(**lookup)
+
+    updated = rollups.update(total=F('total') + total, count=F('count') + count)
+
+    if not updated:
+        try:
+            with atomic():
+                TransactionRollup.objects.create(total=total, count=count, **lookup)
+        except IntegrityError:
+            # row was created by concurrent request
+            rollups.update(total=F('total') + total, count=F('count') + count)
+
+    if count < 0:
+        rollups.filter(count=0).delete()
+
+
+def move_category_to_uncategorized(category):
+    '''
+    Transactions of deleted category get category = NULL,
+    so rollups of the category are added to uncategorized ones.
+    Returns ids of touched months.
+    '''
+    delta = RollupDelta()
+    months = set()
+    for rollup in TransactionRollup.objects.filter(category=category):
+        delta.change((rollup.user_id, rollup.month_id, None, rollup.group),
+                     rollup.total, rollup.count)
+        months.add(rollup.month_id)
+    delta.save()
+    return months
+
+
+def annotate_plan_spent(plans):
+    '''Annotates plans with expenses of their category and month'''
+    expenses = TransactionRollup.objects.filter(
+        user=OuterRef('user'),
+        month=OuterRef('month'),
+        category=OuterRef('category'),
+        group='Expense',
+    ).values('total')[:1]
+
+    return plans.annotate(spent=Coalesce(Subquery(expenses), 0))
+
+
+def aggregate_transactions(users=None):
+    '''Returns {key: (total, count)} computed from transactions'''
+    transactions = TransactionModel.objects.filter(user__isnull=False, group__in=GROUPS)
+    if users is not None:
+        transactions = transactions.filter(user__in=users)
+
+    rows = (transactions
+            .values('user_id', 'month_id', 'category_id', 'group')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by())
+
+    return {(row['user_id'], row['month_id'], row['category_id'], row['group']):
+            (row['total'], row['count']) for row in rows}
+
+
+def stored_rollups(users=None):
+    rollups = TransactionRollup.objects.all()
+    if users is not None:
+        rollups = rollups.filter(user__in=users)
+
+    return {rollup_key(rollup): (rollup.total, rollup.count)
+            for rollup in rollups}
+
+
+@atomic
+def rebuild(users=None):
+    '''Recreates rollup rows from transactions. Returns number of rows'''
+    rollups = TransactionRollup.objects.all()
+    if users is not None:
+        rollups = rollups.filter(user__in=users)
+    rollups.delete()
+
+    created = TransactionRollup.objects.bulk_create(
+        [TransactionRollup(total=total, count=count, **key_lookup(key))
+         for key, (total, count) in aggregate_transactions(users).items()],
+        batch_size=1000,
+    )
+    return len(created)
+
+
+def find_drift(users=None):
+    '''Returns [(key, expected, stored)] for rollups not matching transactions'''
+    expected = aggregate_transactions(users)
+    stored = stored_rollups(users)
+
+    return [(key, expected.get(key), stored.get(key))
+            for key in set(expected) | set(stored)
+            if expected.get(key) != stored.get(key)]
@@ -4,6 +4,7 @@ from graphql import GraphQLError
 import graphene_django_optimizer as gql_optimizer
 
 from budget.models import Category as CategoryModel
+from budget.schema.pagination import paginate
 
 
 class Category(DjangoObjectType):
@@ -12,7 +13,12 @@ class Category(DjangoObjectType):
     class Meta:
         model = CategoryModel
         description = "Type definition for a single category."
-        exclude = ['user', 'transactions', 'plan']
+        exclude = ['user', 'transactions', 'plan', 'change_seq']
+
+
+class CategoryConnection(graphene.relay.Connection):
+    class Meta:
+        node = Category
 
 
 class Query(graphene.ObjectType):
@@ -22,6 +28,11 @@ class Query(graphene.ObjectType):
 
     categories = graphene.List(Category)
 
+    categories_connection = graphene.Field(CategoryConnection,
+                                           first=graphene.Int(),
+                                           after=graphene.String(),
+                                           description='Categories ordered by id, paginated with cursor')
+
     def resolve_category(self, info, id):
         '''Resolves single category'''
         user = info.context.user
@@ -44,3 +55,13 @@ class Query(graphene.ObjectType):
             raise GraphQLError('Unauthorized.')
 
         return gql_optimizer.query(CategoryModel.objects.filter(user=user), info)
+
+    def resolve_categories_connection(self, info, first=None, after=None):
+        '''Resolves page of categories'''
+        user = info.context.user
+
+        if user.is_anonymous:
+            raise GraphQLError('Unauthorized.')
+
+        return paginate(CategoryModel.objects.filter(user=user),
+                        CategoryConnection, ('id',), first, after)
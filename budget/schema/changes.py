@@ -0,0 +1,101 @@
+import base64
+import binascii
+
+import graphene
+from graphql import GraphQLError
+
+from budget.changes import last_change
+from budget.models import Category as CategoryModel
+from budget.models import Month as MonthModel
+from budget.models import Plan as PlanModel
+from budget.models import Tombstone
+from budget.models import Transaction as TransactionModel
+from budget.rollups import annotate_plan_spent
+from budget.schema.categories import Category
+from budget.schema.months import Month
+from budget.schema.plans import Plan
+from budget.schema.transactions import Transaction
+
+
+class SyncedModel(graphene.Enum):
+    TRANSACTION = 'transaction'
+    CATEGORY = 'category'
+    MONTH = 'month'
+    PLAN = 'plan'
+
+
+class DeletedObject(graphene.ObjectType):
+    '''Row deleted after cursor'''
+    type = SyncedModel()
+    id = graphene.ID()
+
+
+class Changes(graphene.ObjectType):
+    '''Rows created, updated or deleted after cursor'''
+    cursor = graphene.String(description='Value of "since" for next changes')
+    transactions = graphene.List(Transaction)
+    categories = graphene.List(Category)
+    months = graphene.List(Month)
+    plans = graphene.List(Plan)
+    deleted = graphene.List(DeletedObject)
+
+
+def encode_change_cursor(change):
+    return base64.urlsafe_b64encode(str(change).encode()).decode()
+
+
+def decode_change_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError, binascii.Error):
+        raise GraphQLError('Invalid cursor.')
+
+
+def changes(user, since=None):
+    '''
+    Returns Changes of rows with change_seq after since, or all rows
+    without since. Cursor is taken before rows are read, so rows
+    committed meanwhile are sent again next time instead of being lost.
+    '''
+    cursor = last_change(user)
+    if since is not None:
+        since = decode_change_cursor(since)
+
+    def changed(model):
+        rows = model.objects.filter(user=user)
+        if since is not None:
+            rows = rows.filter(change_seq__gt=since)
+        return rows
+
+    deleted = []
+    if since is not None:
+        deleted = [DeletedObject(type=row['model'], id=row['object_id'])
+                   for row in (Tombstone.objects
+                               .filter(user=user, change_seq__gt=since)
+                               .values('model', 'object_id')
+                               .order_by('change_seq'))]
+
+    return Changes(
+        cursor=encode_change_cursor(cursor),
+        transactions=changed(TransactionModel),
+        categories=changed(CategoryModel),
+        months=changed(MonthModel),
+        plans=annotate_plan_spent(changed(PlanModel)),
+        deleted=deleted,
+    )
+
+
+class Query(graphene.ObjectType):
+    changes = graphene.Field(Changes,
+                             since=graphene.String(),
+                             description='Rows changed after cursor of previous changes, '
+                                         'all rows without since')
+
+    def resolve_changes(self, info, since=None):
+        '''Resolves changes since cursor'''
+        user = info.context.user
+
+        if user.is_anonymous:
+            raise GraphQLError('Unauthorized.')
+
+        return changes(user, since)
@@ -4,6 +4,7 @@ from graphql import GraphQLError
 import graphene_django_optimizer as gql_optimizer
 
 from budget.models import Month as MonthModel
+from budget.schema.pagination import paginate
 
 
 class Month(DjangoObjectType):
@@ -12,7 +13,12 @@ class Month(DjangoObjectType):
     class Meta:
         model = MonthModel
         description = "Type definition for a single month."
-        exclude = ['user', 'transactions', 'plan']
+        exclude = ['user', 'transactions', 'plan', 'change_seq']
+
+
+class MonthConnection(graphene.relay.Connection):
+    class Meta:
+        node = Month
 
 
 class Query(graphene.ObjectType):
@@ -21,8 +27,18 @@ class Query(graphene.ObjectType):
                            id=graphene.ID(required=True),
                            description='Field "month" takes a number in range 0, 11.')
 
+    month_by_date = graphene.Field(Month,
+                                   year=graphene.Int(required=True),
+                                   month=graphene.Int(required=True),
+                                   description='Month of the year, "month" takes a number in range 0, 11.')
+
     months = graphene.List(Month)
 
+    months_connection = graphene.Field(MonthConnection,
+                                       first=graphene.Int(),
+                                       after=graphene.String(),
+                                       description='Months ordered by year and month, paginated with cursor')
+
     def resolve_month(self, info, id):
         '''Resolves single month'''
         user = info.context.user
@@ -37,6 +53,15 @@ class Query(graphene.ObjectType):
 
         return month
 
+    def resolve_month_by_date(self, info, year, month):
+        '''Resolves month by year and month number'''
+        user = info.context.user
+
+        if user.is_anonymous:
+            raise GraphQLError('Unauthorized.')
+
+        return MonthModel.objects.filter(user=user, year=year, month=month).first()
+
     def resolve_months(self, info, id=None, year=None, month=None):
         '''Resolves months'''
         user = info.context.user
@@ -45,3 +70,13 @@ class Query(graphene.ObjectType):
             raise GraphQLError('Unauthorized.')
 
         return gql_optimizer.query(MonthModel.objects.filter(user=user), info)
+
+    def resolve_months_connection(self, info, first=None, after=None):
+        '''Resolves page of months'''
+        user = info.context.user
+
+        if user.is_anonymous:
+            raise GraphQLError('Unauthorized.')
+
+        return paginate(MonthModel.objects.filter(user=user),
+                        MonthConnection, ('year', 'month', 'id'), first, after)
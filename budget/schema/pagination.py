@@ -0,0 +1,84 @@
+import base64
+import json
+
+import graphene
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from graphql import GraphQLError
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(instance, keys):
+    '''Builds opaque cursor from instance values of ordering keys'''
+    values = [str(getattr(instance, key)) for key in keys]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, keys, model):
+    '''Returns values of ordering keys from cursor converted to types of model fields'''
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise GraphQLError('Invalid cursor.')
+
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise GraphQLError('Invalid cursor.')
+
+    try:
+        # tampered values should not reach the query
+        return [model._meta.get_field(key).to_python(value) for key, value in zip(keys, values)]
+    except (ValidationError, ValueError, TypeError):
+        raise GraphQLError('Invalid cursor.')
+
+
+def keyset_filter(keys, values):
+    '''
+    Returns Q for rows strictly after given values in (keys) order:
+    (a > x) or (a = x and b > y) or ...
+    '''
+    condition = Q()
+    for i, key in enumerate(keys):
+        lookup = {keys[j]: values[j] for j in range(i)}
+        lookup['%s__gt' % key] = values[i]
+        condition |= Q(**lookup)
+    return condition
+
+
+def paginate(queryset, connection, keys, first=None, after=None):
+    '''
+    Keyset pagination. Page is selected with WHERE on ordering keys
+    instead of OFFSET, so every page costs the same.
+    '''
+    if first is None:
+        first = DEFAULT_PAGE_SIZE
+
+    if first < 0:
+        raise GraphQLError('Argument "first" must be a non-negative integer.')
+
+    first = min(first, MAX_PAGE_SIZE)
+
+    queryset = queryset.order_by(*keys)
+
+    if after is not None:
+        queryset = queryset.filter(keyset_filter(keys, decode_cursor(after, keys, queryset.model)))
+
+    # fetching one extra row to know if there is a next page
+    rows = list(queryset[:first + 1])
+    has_next_page = len(rows) > first
+    rows = rows[:first]
+
+    edges = [connection.Edge(node=row, cursor=encode_cursor(row, keys))
+             for row in rows]
+
+    return connection(
+        edges=edges,
+        page_info=graphene.relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=after is not None,
+            has_next_page=has_next_page,
+        ),
+    )
@@ -2,10 +2,19 @@ import graphene
 from graphene_django import DjangoObjectType
 from graphql import GraphQLError
 import graphene_django_optimizer as gql_optimizer
+from promise import Promise
 
-from budget.models import Category as CategoryModel
-from budget.models import Month as MonthModel
 from budget.models import Plan as PlanModel
+from budget.loaders import get_loaders, load_related
+from budget.rollups import annotate_plan_spent
+from budget.schema.pagination import paginate
+
+
+def load_spent(plan, info):
+    '''Uses spent annotation of list queries, otherwise batches with loader'''
+    if hasattr(plan, 'spent'):
+        return Promise.resolve(plan.spent)
+    return get_loaders(info.context).plan_spent.load(plan.pk)
 
 
 class Plan(DjangoObjectType):
@@ -14,7 +23,45 @@ class Plan(DjangoObjectType):
     class Meta:
         model = PlanModel
         description = "Type definition for a single plan."
-        exclude = ['user']
+        exclude = ['user', 'change_seq']
+
+    spent = graphene.Int(description='Expenses of plan category in plan month')
+    remaining = graphene.Int(description='Planned amount minus spent')
+    percent_used = graphene.Float(description='Spent as percent of planned amount')
+
+    def resolve_spent(self, info):
+        return load_spent(self, info)
+
+    def resolve_remaining(self, info):
+        if self.planned_amount is None:
+            return None
+        return load_spent(self, info).then(
+            lambda spent: self.planned_amount - spent)
+
+    def resolve_percent_used(self, info):
+        if not self.planned_amount:
+            return None
+        return load_spent(self, info).then(
+            lambda spent: round(spent * 100 / self.planned_amount, 2))
+
+    @gql_optimizer.resolver_hints(model_field='category')
+    def resolve_category(self, info):
+        return load_related(self, 'category', info)
+
+    @gql_optimizer.resolver_hints(model_field='month')
+    def resolve_month(self, info):
+        return load_related(self, 'month', info)
+
+
+class PlanConnection(graphene.relay.Connection):
+    class Meta:
+        node = Plan
+
+
+def filter_plans(user, **filters):
+    '''Returns user's plans filtered by not None args'''
+    filters = {k: v for k, v in filters.items() if v is not None}
+    return PlanModel.objects.filter(user=user, **filters)
 
 
 class Query(graphene.ObjectType):
@@ -25,6 +72,17 @@ class Query(graphene.ObjectType):
                           category=graphene.ID(),
                           month=graphene.ID())
 
+    plans_connection = graphene.Field(PlanConnection,
+                                      first=graphene.Int(),
+                                      after=graphene.String(),
+                                      category=graphene.ID(),
+                                      month=graphene.ID(),
+                                      description='Plans ordered by id, paginated with cursor')
+
+    plan_progress = graphene.List(Plan,
+                                  month=graphene.ID(required=True),
+                                  description='Plans of month with spent, remaining and percent used')
+
     def resolve_plan(self, info, id):
         '''Resolves single month'''
         user = info.context.user
@@ -47,30 +105,29 @@ class Query(graphene.ObjectType):
         if user.is_anonymous:
             raise GraphQLError('Unauthorized.')
 
-        category_id = category
-        month_id = month
+        plans = annotate_plan_spent(filter_plans(user, category=category, month=month))
 
-        if category_id is not None:
-            try:
-                category = CategoryModel.objects.get(id=category_id)
-            except CategoryModel.DoesNotExist:
-                return []
+        return gql_optimizer.query(plans, info)
 
-        if month_id is not None:
-            try:
-                month = MonthModel.objects.get(id=month_id)
-            except MonthModel.DoesNotExist:
-                return []
+    def resolve_plans_connection(self, info, first=None, after=None, category=None, month=None):
+        '''Resolves page of plans'''
+        user = info.context.user
 
-        # saving passed args for filter and deleting fields we cannot pass in filter
-        saved_args = locals()
+        if user.is_anonymous:
+            raise GraphQLError('Unauthorized.')
 
-        del saved_args['self']
-        del saved_args['info']
-        del saved_args['category_id']
-        del saved_args['month_id']
+        plans = annotate_plan_spent(filter_plans(user, category=category, month=month))
+
+        return paginate(plans.select_related('category', 'month'),
+                        PlanConnection, ('id',), first, after)
+
+    def resolve_plan_progress(self, info, month):
+        '''Resolves plans of month with actual expenses'''
+        user = info.context.user
+
+        if user.is_anonymous:
+            raise GraphQLError('Unauthorized.')
 
-        # creating new dict with not None args
-        saved_args = {k: v for k, v in saved_args.items() if v is not None}
+        plans = annotate_plan_spent(filter_plans(user, month=month))
 
-        return gql_optimizer.query(PlanModel.objects.filter(**saved_args), info)
+        return gql_optimizer.query(plans.order_by('id'), info)
@@ -0,0 +1,305 @@
+import datetime
+
+import graphene
+from django.db.models import Case, Count, DateField, F, IntegerField, Sum, Value, When, Window
+from django.db.models.functions import Trunc
+from graphql import GraphQLError
+
+from budget.models import Month as MonthModel
+from budget.models import Transaction as TransactionModel
+from budget.models import TransactionRollup
+from budget.schema.transactions import TransactionGroups
+
+
+class GroupTotal(graphene.ObjectType):
+    '''Sum of transactions of one group'''
+    group = TransactionGroups()
+    total = graphene.Int()
+    count = graphene.Int()
+
+
+class CategoryTotal(graphene.ObjectType):
+    '''Sum of transactions of one category inside one group'''
+    category = graphene.ID()
+    name = graphene.String()
+    color = graphene.String()
+    group = TransactionGroups()
+    total = graphene.Int()
+    count = graphene.Int()
+
+
+class MonthSummary(graphene.ObjectType):
+    '''
+    Month totals.
+    Closing balance = start balance + income - expense - savings.
+    '''
+    month = graphene.ID()
+    start_month_balance = graphene.Int()
+    start_month_savings = graphene.Int()
+    income = graphene.Int()
+    expense = graphene.Int()
+    savings = graphene.Int()
+    closing_balance = graphene.Int()
+    closing_savings = graphene.Int()
+    groups = graphene.List(GroupTotal)
+    categories = graphene.List(CategoryTotal)
+
+
+def month_summary(user, month_id):
+    '''
+    Builds MonthSummary from one query over month rollups
+    joined with month. Returns None if user has no such month.
+    '''
+    rows = list(TransactionRollup.objects
+                .filter(user=user, month_id=month_id, month__user=user, count__gt=0)
+                .values('month__start_month_balance',
+                        'month__start_month_savings',
+                        'group',
+                        'category_id',
+                        'category__name',
+                        'category__color',
+                        'total',
+                        'count')
+                .order_by('group', 'category_id'))
+
+    if rows:
+        start_month_balance = rows[0]['month__start_month_balance']
+        start_month_savings = rows[0]['month__start_month_savings']
+    else:
+        # month without transactions, only start values are needed
+        try:
+            month = MonthModel.objects.only(
+                'start_month_balance', 'start_month_savings').get(id=month_id, user=user)
+        except MonthModel.DoesNotExist:
+            return None
+        start_month_balance = month.start_month_balance
+        start_month_savings = month.start_month_savings
+
+    start_month_balance = start_month_balance or 0
+    start_month_savings = start_month_savings or 0
+
+    totals = {group: {'total': 0, 'count': 0}
+              for group, _ in TransactionModel.GROUP_CHOICES}
+    categories = []
+
+    for row in rows:
+        if row['group'] not in totals:
+            # older rows can have something else than a group choice in group
+            continue
+
+        totals[row['group']]['total'] += row['total']
+        totals[row['group']]['count'] += row['count']
+        categories.append(CategoryTotal(
+            category=row['category_id'],
+            name=row['category__name'],
+            color=row['category__color'],
+            group=row['group'],
+            total=row['total'],
+            count=row['count'],
+        ))
+
+    income = totals['Income']['total']
+    expense = totals['Expense']['total']
+    savings = totals['Savings']['total']
+
+    return MonthSummary(
+        month=month_id,
+        start_month_balance=start_month_balance,
+        start_month_savings=start_month_savings,
+        income=income,
+        expense=expense,
+        savings=savings,
+        closing_balance=start_month_balance + income - expense - savings,
+        closing_savings=start_month_savings + savings,
+        groups=[GroupTotal(group=group, **total)
+                for group, total in totals.items()],
+        categories=categories,
+    )
+
+
+class BalancePoint(graphene.ObjectType):
+    '''Balance and savings at the end of the day'''
+    date = graphene.String()
+    balance = graphene.Int()
+    savings = graphene.Int()
+
+
+BALANCE_CHANGE = Case(
+    When(group='Income', then=F('amount')),
+    When(group__in=['Expense', 'Savings'], then=-F('amount')),
+    default=Value(0),
+    output_field=IntegerField(),
+)
+
+SAVINGS_CHANGE = Case(
+    When(group='Savings', then=F('amount')),
+    default=Value(0),
+    output_field=IntegerField(),
+)
+
+
+def balance_series(user, month_id=None, year=None):
+    '''
+    Returns daily BalancePoints of a month or a year starting from
+    start values of the (first) month. Running sums are computed by
+    the database with SUM() OVER (ORDER BY created_at); rows of one day
+    share the same running sum, so DISTINCT leaves one row per day.
+    '''
+    months = MonthModel.objects.filter(user=user)
+    transactions = TransactionModel.objects.filter(user=user)
+
+    if month_id is not None:
+        months = months.filter(id=month_id)
+        transactions = transactions.filter(month_id=month_id)
+    else:
+        months = months.filter(year=year)
+        transactions = transactions.filter(month__year=year)
+
+    first_month = months.order_by('year', 'month').first()
+    if first_month is None:
+        return []
+
+    start_month_balance = first_month.start_month_balance or 0
+    start_month_savings = first_month.start_month_savings or 0
+
+    points = (transactions
+              .annotate(balance=Window(Sum(BALANCE_CHANGE), order_by=F('created_at').asc()),
+                        savings=Window(Sum(SAVINGS_CHANGE), order_by=F('created_at').asc()))
+              .values('created_at', 'balance', 'savings')
+              .distinct()
+              .order_by('created_at'))
+
+    return [BalancePoint(date=point['created_at'],
+                         balance=start_month_balance + point['balance'],
+                         savings=start_month_savings + point['savings'])
+            for point in points]
+
+
+MAX_SERIES_BUCKETS = 1000
+
+
+class SeriesBucket(graphene.Enum):
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+    YEAR = 'year'
+
+
+class SeriesGroupBy(graphene.Enum):
+    CATEGORY = 'category'
+    GROUP = 'group'
+
+
+class SeriesPoint(graphene.ObjectType):
+    '''Sum of transactions of one category and group or of one group in one bucket'''
+    date = graphene.String(description='First day of the bucket')
+    category = graphene.ID()
+    name = graphene.String()
+    group = TransactionGroups()
+    total = graphene.Int()
+    count = graphene.Int()
+
+
+def count_buckets(date_from, date_to, bucket):
+    if bucket == 'day':
+        return (date_to - date_from).days + 1
+    if bucket == 'week':
+        return (date_to - date_from).days // 7 + 2
+    if bucket == 'month':
+        return (date_to.year - date_from.year) * 12 + date_to.month - date_from.month + 1
+    return date_to.year - date_from.year + 1
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise GraphQLError('Date format is YYYY-MM-DD.')
+
+
+def spending_series(user, date_from, date_to, bucket, group_by, group=None):
+    '''
+    Returns SeriesPoints of transactions aggregated by the database
+    per bucket, so size of result depends on number of buckets only.
+    '''
+    transactions = TransactionModel.objects.filter(
+        user=user, created_at__gte=date_from, created_at__lte=date_to)
+
+    if group is not None:
+        transactions = transactions.filter(group=group)
+
+    # income and expense of one category are separate points
+    keys = ['category_id', 'category__name', 'group'] if group_by == 'category' else ['group']
+
+    rows = (transactions
+            .annotate(date=Trunc('created_at', bucket, output_field=DateField()))
+            .values('date', *keys)
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by('date', *keys))
+
+    return [SeriesPoint(date=row['date'],
+                        category=row.get('category_id'),
+                        name=row.get('category__name'),
+                        group=row.get('group'),
+                        total=row['total'],
+                        count=row['count'])
+            for row in rows]
+
+
+class Query(graphene.ObjectType):
+    month_summary = graphene.Field(MonthSummary,
+                                   month=graphene.ID(required=True),
+                                   description='Month totals computed on the server')
+
+    balance_series = graphene.List(BalancePoint,
+                                   month=graphene.ID(),
+                                   year=graphene.Int(),
+                                   description='Daily running balance of a month or a year')
+
+    spending_series = graphene.List(SeriesPoint,
+                                    date_from=graphene.String(required=True, name='from'),
+                                    to=graphene.String(required=True),
+                                    bucket=SeriesBucket(required=True),
+                                    group_by=SeriesGroupBy(required=True),
+                                    group=TransactionGroups(),
+                                    description='Transaction totals per day, week, month or year. '
+                                                'Date format - YYYY-MM-DD')
+
+    def resolve_month_summary(self, info, month):
+        '''Resolves month summary'''
+        user = info.context.user
+
+        if user.is_anonymous:
+            raise GraphQLError('Unauthorized.')
+
+        return month_summary(user, month)
+
+    def resolve_balance_series(self, info, month=None, year=None):
+        '''Resolves running balance series'''
+        user = info.context.user
+
+        if user.is_anonymous:
+            raise GraphQLError('Unauthorized.')
+
+        if month is None and year is None:
+            raise GraphQLError('Month or year is required.')
+
+        return balance_series(user, month_id=month, year=year)
+
+    def resolve_spending_series(self, info, date_from, to, bucket, group_by, group=None):
+        '''Resolves bucketed transaction totals'''
+        user = info.context.user
+
+        if user.is_anonymous:
+            raise GraphQLError('Unauthorized.')
+
+        date_from = parse_date(date_from)
+        date_to = parse_date(to)
+
+        if date_from > date_to:
+            raise GraphQLError('"from" is after "to".')
+
+        if count_buckets(date_from, date_to, bucket) > MAX_SERIES_BUCKETS:
+            raise GraphQLError('Too many buckets, max is %s.' % MAX_SERIES_BUCKETS)
+
+        return spending_series(user, date_from, date_to, bucket, group_by, group)
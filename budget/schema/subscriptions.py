@@ -0,0 +1,66 @@
+import graphene
+from graphql import GraphQLError
+from rx import Observable
+
+from budget.actions import get_user_instances
+from budget.models import Transaction as TransactionModel
+from budget.schema.reports import MonthSummary, month_summary
+from budget.schema.transactions import Transaction
+
+
+class TransactionChanges(graphene.ObjectType):
+    '''Transactions changed by one mutation'''
+    created = graphene.List(Transaction)
+    updated = graphene.List(Transaction)
+    deleted = graphene.List(graphene.ID)
+
+
+def transaction_changes(user, message):
+    '''Builds TransactionChanges from event with one id__in query'''
+    transactions = get_user_instances(
+        TransactionModel, user, message['created'] + message['updated'])
+
+    return TransactionChanges(
+        created=[transactions[id] for id in message['created'] if id in transactions],
+        updated=[transactions[id] for id in message['updated'] if id in transactions],
+        deleted=message['deleted'],
+    )
+
+
+class Subscription(graphene.ObjectType):
+    '''
+    Fields are observables of info.context.events, stream of change
+    events of the user published by budget.events.publish_changes.
+    '''
+    transactions_changed = graphene.Field(TransactionChanges,
+                                          description='Transactions created, updated '
+                                                      'or deleted by one mutation')
+
+    month_summary_changed = graphene.Field(MonthSummary,
+                                           month=graphene.ID(),
+                                           description='Month totals after change of '
+                                                       'the month or its transactions')
+
+    def resolve_transactions_changed(self, info):
+        '''Resolves stream of transaction changes'''
+        user = info.context.user
+
+        if user.is_anonymous:
+            raise GraphQLError('Unauthorized.')
+
+        return (info.context.events
+                .filter(lambda message: message['created'] or message['updated']
+                        or message['deleted'])
+                .map(lambda message: transaction_changes(user, message)))
+
+    def resolve_month_summary_changed(self, info, month=None):
+        '''Resolves stream of month summaries'''
+        user = info.context.user
+
+        if user.is_anonymous:
+            raise GraphQLError('Unauthorized.')
+
+        return (info.context.events
+                .flat_map(lambda message: Observable.from_(message['months']))
+                .filter(lambda month_id: month is None or month_id == str(month))
+                .map(lambda month_id: month_summary(user, month_id)))
@@ -4,8 +4,8 @@ from graphql import GraphQLError
 import graphene_django_optimizer as gql_optimizer
 
 from budget.models import Transaction as TransactionModel
-from budget.models import Category as CategoryModel
-from budget.models import Month as MonthModel
+from budget.loaders import load_related
+from budget.schema.pagination import paginate
 
 
 class TransactionGroups(graphene.Enum):
@@ -20,10 +20,29 @@ class Transaction(DjangoObjectType):
     class Meta:
         model = TransactionModel
         description = "Type definition for a single transaction."
-        exclude = ['user']
+        exclude = ['user', 'change_seq']
 
     created_at = graphene.String()
 
+    @gql_optimizer.resolver_hints(model_field='category')
+    def resolve_category(self, info):
+        return load_related(self, 'category', info)
+
+    @gql_optimizer.resolver_hints(model_field='month')
+    def resolve_month(self, info):
+        return load_related(self, 'month', info)
+
+
+class TransactionConnection(graphene.relay.Connection):
+    class Meta:
+        node = Transaction
+
+
+def filter_transactions(user, **filters):
+    '''Returns user's transactions filtered by not None args'''
+    filters = {k: v for k, v in filters.items() if v is not None}
+    return TransactionModel.objects.filter(user=user, **filters)
+
 
 class Query(graphene.ObjectType):
 
@@ -37,6 +56,15 @@ class Query(graphene.ObjectType):
                                  month=graphene.ID(),
                                  group=TransactionGroups())
 
+    transactions_connection = graphene.Field(TransactionConnection,
+                                             first=graphene.Int(),
+                                             after=graphene.String(),
+                                             created_at=graphene.String(),
+                                             category=graphene.ID(),
+                                             month=graphene.ID(),
+                                             group=TransactionGroups(),
+                                             description='Transactions ordered by (createdAt, id), paginated with cursor')
+
     def resolve_transaction(self, info, id):
         '''Resolves single transaction'''
         user = info.context.user
@@ -63,30 +91,33 @@ class Query(graphene.ObjectType):
         if user.is_anonymous:
             raise GraphQLError('Unauthorized.')
 
-        category_id = category
-        month_id = month
-
-        if category_id is not None:
-            try:
-                category = CategoryModel.objects.get(
-                    id=category_id)
-            except CategoryModel.DoesNotExist:
-                return []
-
-        if month_id is not None:
-            try:
-                month = MonthModel.objects.get(id=month_id)
-            except MonthModel.DoesNotExist:
-                return []
-
-        # saving passed args for filter and deleting fields we cannot pass in filter
-        saved_args = locals()
-        del saved_args['self']
-        del saved_args['info']
-        del saved_args['category_id']
-        del saved_args['month_id']
-
-        # creating new dict with not None args
-        saved_args = {k: v for k, v in saved_args.items() if v is not None}
-
-        return gql_optimizer.query(TransactionModel.objects.filter(**saved_args), info)
+        transactions = filter_transactions(user,
+                                           group=group,
+                                           created_at=created_at,
+                                           category=category,
+                                           month=month)
+
+        return gql_optimizer.query(transactions, info)
+
+    def resolve_transactions_connection(self,
+                                        info,
+                                        first=None,
+                                        after=None,
+                                        group=None,
+                                        created_at=None,
+                                        category=None,
+                                        month=None):
+        '''Resolves page of transactions ordered by (created_at, id).'''
+        user = info.context.user
+
+        if user.is_anonymous:
+            raise GraphQLError('Unauthorized.')
+
+        transactions = filter_transactions(user,
+                                           group=group,
+                                           created_at=created_at,
+                                           category=category,
+                                           month=month)
+
+        return paginate(transactions.select_related('category', 'month'),
+                        TransactionConnection, ('created_at', 'id'), first, after)
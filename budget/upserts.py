@@ -0,0 +1,14 @@
+def insert_or_get(instance, unique_fields):
+    '''
+    Inserts instance with INSERT ... ON CONFLICT DO NOTHING on the unique
+    constraint of unique_fields and reads the row back with its index,
+    so concurrent requests end up with the same row.
+    Returns (row, created). Instance should have a new change_seq,
+    the row is created by this request if it has the same one.
+    '''
+    model = type(instance)
+    model.objects.bulk_create([instance], ignore_conflicts=True)
+
+    row = model.objects.get(**{field: getattr(instance, field) for field in unique_fields})
+
+    return row, row.change_seq == instance.change_seq
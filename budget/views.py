@@ -0,0 +1,58 @@
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from budget.export import EXPORT_FORMATS
+from budget.importers import PARSERS, TransactionImporter, guess_format, parse_statement
+
+
+@require_GET
+def export_transactions(request):
+    '''
+    Streams all transactions of the user as CSV or NDJSON (?format=ndjson).
+    Response starts before first query, rows are sent chunk by chunk.
+    '''
+    if request.user.is_anonymous:
+        return JsonResponse({'errors': [{'message': 'Unauthorized.'}]}, status=401)
+
+    format = request.GET.get('format', 'csv')
+
+    if format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest('Format should be one of: %s.' % ', '.join(EXPORT_FORMATS))
+
+    export, content_type, filename = EXPORT_FORMATS[format]
+
+    response = StreamingHttpResponse(export(request.user), content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+@csrf_exempt
+@require_POST
+def import_transactions(request):
+    '''
+    Imports transactions from uploaded bank statement, multipart field "file".
+    Format is taken from ?format= or file extension: csv, ofx or qif.
+    Rows matching existing transactions are skipped, or imported
+    with ?duplicates=keep. Returns report with number of rows, rows/s,
+    duplicates and rejected rows.
+    '''
+    if request.user.is_anonymous:
+        return JsonResponse({'errors': [{'message': 'Unauthorized.'}]}, status=401)
+
+    file = request.FILES.get('file')
+
+    if file is None:
+        return HttpResponseBadRequest('Statement should be uploaded in "file" field.')
+
+    format = request.GET.get('format') or guess_format(file.name)
+
+    if format not in PARSERS:
+        return HttpResponseBadRequest('Format should be one of: %s.' % ', '.join(PARSERS))
+
+    importer = TransactionImporter(
+        request.user, skip_duplicates=request.GET.get('duplicates') != 'keep',
+    ).run(parse_statement(file, format))
+
+    return JsonResponse(importer.report())
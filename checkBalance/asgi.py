@@ -9,8 +9,24 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'checkBalance.settings')
+os.environ.setdefault('GRAPHQL_ASYNC', 'True')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+# imported after django is set up
+from checkBalance.handlers import PooledStreamingASGIHandler  # noqa: E402
+from checkBalance.subscriptions import websocket_application  # noqa: E402
+
+# same as get_asgi_application(), streaming responses are iterated in thread pool
+django_application = PooledStreamingASGIHandler()
+
+
+async def application(scope, receive, send):
+    '''Websockets are graphql subscriptions, everything else goes to django'''
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from graphql import parse, validate
+from graphql.backend.base import GraphQLBackend, GraphQLDocument
+from graphql.execution import execute, ExecutionResult
+
+
+class LRUDocumentBackend(GraphQLBackend):
+    '''
+    Keeps last parsed and validated documents of this worker.
+    Validation doesn't depend on operation name or variables,
+    so query text is the key. Invalid documents are not kept.
+    '''
+
+    def __init__(self, size, executor=None):
+        self.size = size
+        self.executor = executor
+        self.documents = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def document_from_string(self, schema, document_string):
+        key = (schema, document_string)
+
+        with self.lock:
+            document = self.documents.get(key)
+            if document is not None:
+                self.documents.move_to_end(key)
+                self.hits += 1
+                return document
+            self.misses += 1
+
+        document_ast = parse(document_string)
+        errors = validate(schema, document_ast)
+
+        if errors:
+            return GraphQLDocument(
+                schema=schema,
+                document_string=document_string,
+                document_ast=document_ast,
+                execute=lambda *args, **kwargs: ExecutionResult(errors=errors, invalid=True),
+            )
+
+        document = GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=partial(execute, schema, document_ast, executor=self.executor),
+        )
+
+        with self.lock:
+            self.documents[key] = document
+            while len(self.documents) > self.size:
+                self.documents.popitem(last=False)
+
+        return document
+
+    def info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.documents),
+            'max_size': self.size,
+        }
+
+    def clear(self):
+        with self.lock:
+            self.documents.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+document_backend = LRUDocumentBackend(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
@@ -0,0 +1,49 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+from checkBalance.views import run_in_pool
+
+
+class PooledStreamingASGIHandler(ASGIHandler):
+    '''
+    Django 3.2 iterates streaming responses on the event loop, so queries
+    made by the iterator (e.g. export of transactions) would block every
+    request and websocket of the worker. This handler takes every part
+    of streaming response in graphql_executor and awaits it.
+    '''
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+
+        parts = iter(response)
+        while True:
+            part = await run_in_pool(next, parts, None)
+            if part is None:
+                break
+
+            for chunk, _ in self.chunk_bytes(part):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
@@ -0,0 +1,101 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+import graphene
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from graphql.language import ast
+
+from budget.models import IdempotentRequest
+
+
+ARGUMENT_NAME = 'idempotencyKey'
+
+
+def IdempotencyKey():
+    '''Argument of mutations, same as Idempotency-Key header'''
+    return graphene.String(description='Repeated request with the same key '
+                                       'returns stored result without changes')
+
+
+def takes_idempotency_key(mutate):
+    '''
+    Decorator for mutate methods with IdempotencyKey argument.
+    Key is handled by the view before execution, so it is dropped here.
+    '''
+    @wraps(mutate)
+    def wrapper(root, info, *args, **kwargs):
+        kwargs.pop('idempotency_key', None)
+        return mutate(root, info, *args, **kwargs)
+
+    return wrapper
+
+
+def argument_keys(operation, variables):
+    '''Returns idempotencyKey arguments of root fields of operation'''
+    keys = []
+
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, ast.Field):
+            continue
+
+        for argument in selection.arguments or []:
+            if argument.name.value != ARGUMENT_NAME:
+                continue
+
+            if isinstance(argument.value, ast.Variable):
+                value = (variables or {}).get(argument.value.name.value)
+            else:
+                value = getattr(argument.value, 'value', None)
+
+            if value:
+                keys.append(str(value))
+
+    return keys
+
+
+def get_idempotency_key(request, operation, variables, use_header=True):
+    '''Returns key from Idempotency-Key header or arguments of the mutation'''
+    keys = argument_keys(operation, variables)
+
+    header = request.META.get('HTTP_IDEMPOTENCY_KEY') if use_header else None
+    if header:
+        keys.insert(0, header)
+
+    return ','.join(keys) or None
+
+
+def request_hash(query, variables, operation_name):
+    data = json.dumps([query, variables, operation_name], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def hash_key(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def claim(user, key, hash):
+    '''
+    Inserts key of user, returns None if the key is new or IdempotentRequest
+    stored for it. Must be called in transaction.atomic() around the mutation:
+    the key is kept only if the mutation is committed, and request with the
+    same key waits on the unique index until the first one is finished.
+    '''
+    IdempotentRequest.objects.filter(
+        user=user, created_at__lt=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    ).delete()
+
+    try:
+        with transaction.atomic():
+            IdempotentRequest.objects.create(user=user, key=hash_key(key), request_hash=hash)
+    except IntegrityError:
+        return IdempotentRequest.objects.get(user=user, key=hash_key(key))
+
+    return None
+
+
+def save_response(user, key, response):
+    IdempotentRequest.objects.filter(user=user, key=hash_key(key)).update(response=response)
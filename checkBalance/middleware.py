@@ -0,0 +1,50 @@
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.utils import get_http_authorization, get_payload, get_user_by_payload
+
+from users import token_cache
+
+
+def get_token_user(token, request=None):
+    '''Returns user of token, raises JSONWebTokenError if token is invalid'''
+    user = token_cache.get_user(token)
+    if user is not None:
+        return user
+
+    payload = get_payload(token, request)
+    user = get_user_by_payload(payload)
+
+    if user is not None:
+        token_cache.set_user(token, user, payload)
+
+    return user
+
+
+def get_user(request, session_user):
+    token = get_http_authorization(request)
+
+    if not session_user.is_anonymous or token is None:
+        return session_user
+
+    try:
+        user = get_token_user(token, request)
+    except JSONWebTokenError as e:
+        request.jwt_error = e
+        return session_user
+
+    return user or session_user
+
+
+class JSONWebTokenAuthenticationMiddleware(MiddlewareMixin):
+    '''
+    Authenticates JWT from Authorization header once per request.
+    Replaces per-field graphql_jwt middleware. Token is decoded on first
+    access to request.user; invalid token error is kept in request.jwt_error.
+    Users of recent tokens are taken from users.token_cache.
+    Should go after AuthenticationMiddleware.
+    '''
+
+    def process_request(self, request):
+        session_user = request.user
+        request.user = SimpleLazyObject(lambda: get_user(request, session_user))
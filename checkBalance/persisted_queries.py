@@ -0,0 +1,41 @@
+import hashlib
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+CACHE_PREFIX = 'persisted-query:'
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def get_allowlist():
+    '''
+    Returns {sha256: query} from PERSISTED_QUERIES_ALLOWLIST json file
+    or None if allow-list mode is off.
+    '''
+    path = getattr(settings, 'PERSISTED_QUERIES_ALLOWLIST', None)
+
+    if not path:
+        return None
+
+    with open(path) as allowlist:
+        return json.load(allowlist)
+
+
+def get_persisted_query(sha256):
+    allowlist = get_allowlist()
+
+    if allowlist is not None:
+        return allowlist.get(sha256)
+
+    return cache.get(CACHE_PREFIX + sha256)
+
+
+def save_persisted_query(sha256, query):
+    cache.set(CACHE_PREFIX + sha256, query, timeout=settings.PERSISTED_QUERIES_TIMEOUT)
@@ -0,0 +1,103 @@
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+class InProcessBroker:
+    '''
+    Delivers messages to subscribers of the same process.
+    Callbacks are called in the thread of publisher, so they should
+    only hand the message over, e.g. to event loop.
+    '''
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, channel, callback):
+        '''Returns function cancelling the subscription'''
+        with self.lock:
+            self.subscribers[channel].add(callback)
+
+        return lambda: self.unsubscribe(channel, callback)
+
+    def unsubscribe(self, channel, callback):
+        with self.lock:
+            callbacks = self.subscribers.get(channel)
+            if callbacks is None:
+                return False
+            callbacks.discard(callback)
+            if not callbacks:
+                del self.subscribers[channel]
+            return not callbacks
+
+    def publish(self, channel, message):
+        with self.lock:
+            callbacks = list(self.subscribers.get(channel, ()))
+
+        for callback in callbacks:
+            callback(message)
+
+
+class RedisBroker:
+    '''
+    Delivers messages through redis pub/sub, so subscribers of all
+    workers get them. Requires redis package and SUBSCRIPTIONS_REDIS_URL.
+    '''
+
+    def __init__(self):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisBroker requires redis package.')
+
+        self.redis = redis.Redis.from_url(settings.SUBSCRIPTIONS_REDIS_URL)
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self.local = InProcessBroker()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self, channel, callback):
+        with self.lock:
+            if channel not in self.local.subscribers:
+                self.pubsub.subscribe(**{channel: self.deliver})
+            if self.thread is None:
+                self.thread = self.pubsub.run_in_thread(sleep_time=1, daemon=True)
+            self.local.subscribe(channel, callback)
+
+        return lambda: self.unsubscribe(channel, callback)
+
+    def unsubscribe(self, channel, callback):
+        with self.lock:
+            if self.local.unsubscribe(channel, callback):
+                self.pubsub.unsubscribe(channel)
+
+    def deliver(self, message):
+        self.local.publish(message['channel'].decode(), json.loads(message['data']))
+
+    def publish(self, channel, message):
+        self.redis.publish(channel, json.dumps(message))
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.SUBSCRIPTIONS_BROKER)()
+
+
+def user_channel(user_id):
+    return 'user:%s' % user_id
+
+
+def subscribe(user_id, callback):
+    '''Subscribes callback to messages of user, returns unsubscribe function'''
+    return get_broker().subscribe(user_channel(user_id), callback)
+
+
+def publish(user_id, message):
+    '''Sends JSON serializable message to subscribers of user'''
+    get_broker().publish(user_channel(user_id), message)
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.transaction import on_commit
+
+
+VERSION_PREFIX = 'data-version:'
+RESPONSE_PREFIX = 'response:'
+
+
+def get_cache():
+    '''
+    Returns cache shared by workers or None. Data versions should be
+    seen by every worker, so responses are not cached without it.
+    '''
+    alias = settings.RESPONSE_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def get_data_version(user_id):
+    '''
+    Returns version of user's data. Starts from current time,
+    so version lost from cache never goes back to old values.
+    '''
+    cache = get_cache()
+    key = VERSION_PREFIX + str(user_id)
+    version = cache.get(key)
+
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_data_version(user_id):
+    cache = get_cache()
+    if cache is None:
+        return
+
+    key = VERSION_PREFIX + str(user_id)
+
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def bumps_data_version(mutate):
+    '''
+    Decorator for mutate methods. Invalidates cached responses of
+    the user after the db transaction of the mutation is committed.
+    '''
+    @wraps(mutate)
+    def wrapper(root, info, *args, **kwargs):
+        result = mutate(root, info, *args, **kwargs)
+        user = getattr(info.context, 'user', None)
+
+        if user is not None and user.is_authenticated:
+            user_id = user.pk
+            on_commit(lambda: bump_data_version(user_id))
+
+        return result
+
+    return wrapper
+
+
+def document_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def response_key(user_id, query, variables, operation_name):
+    '''Key of query response for the current version of user's data'''
+    data = json.dumps([document_hash(query), variables, operation_name],
+                      sort_keys=True, default=str)
+
+    return '%s%s:%s:%s' % (RESPONSE_PREFIX, user_id, get_data_version(user_id),
+                           hashlib.sha256(data.encode()).hexdigest())
+
+
+def get_response(key):
+    return get_cache().get(key)
+
+
+def set_response(key, response):
+    get_cache().set(key, response, timeout=settings.RESPONSE_CACHE_TIMEOUT)
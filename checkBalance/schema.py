@@ -2,9 +2,12 @@ import graphene
 import graphql_jwt
 
 import budget.schema.categories
+import budget.schema.changes
 import budget.schema.transactions
 import budget.schema.months
 import budget.schema.plans
+import budget.schema.reports
+import budget.schema.subscriptions
 import budget.mutations.categories
 import budget.mutations.transactions
 import budget.mutations.months
@@ -23,6 +26,8 @@ class Query(
         budget.schema.transactions.Query,
         budget.schema.months.Query,
         budget.schema.plans.Query,
+        budget.schema.reports.Query,
+        budget.schema.changes.Query,
         graphene.ObjectType):
     pass
 
@@ -37,4 +42,10 @@ class Mutation(
     pass
 
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
+class Subscription(
+        budget.schema.subscriptions.Subscription,
+        graphene.ObjectType):
+    pass
+
+
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
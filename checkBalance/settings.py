@@ -52,6 +52,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'checkBalance.middleware.JSONWebTokenAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -87,13 +88,50 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', default=''),
+    }
+}
+
+# name of cache in CACHES shared by workers, query responses and ETags are off if not set
+RESPONSE_CACHE_ALIAS = env('RESPONSE_CACHE_ALIAS', default=None)
+# seconds to keep cached query responses, they are also dropped by data version
+RESPONSE_CACHE_TIMEOUT = 300
+# seconds to keep responses of mutations with idempotency key
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
 GRAPHENE = {
     'SCHEMA': 'checkBalance.schema.schema',
-    'MIDDLEWARE': [
-        'graphql_jwt.middleware.JSONWebTokenMiddleware',
-    ],
+    # JWT is authenticated once per request by JSONWebTokenAuthenticationMiddleware
+    'MIDDLEWARE': [],
 }
 
+# json file {sha256: query}, if set only these queries are executed
+PERSISTED_QUERIES_ALLOWLIST = env('PERSISTED_QUERIES_ALLOWLIST', default=None)
+# seconds to keep automatically persisted queries in cache, None is forever
+PERSISTED_QUERIES_TIMEOUT = None
+# number of parsed and validated graphql documents kept by each worker
+GRAPHQL_DOCUMENT_CACHE_SIZE = 500
+# max number of operations in one batched request
+GRAPHQL_MAX_BATCH_SIZE = 20
+# graphql route is served by async view, asgi.py turns it on
+GRAPHQL_ASYNC = env.bool('GRAPHQL_ASYNC', default=False)
+# max number of graphql operations executed at once by async view
+GRAPHQL_ASYNC_THREADS = env.int('GRAPHQL_ASYNC_THREADS', default=10)
+# delivers events of subscriptions, use checkBalance.pubsub.RedisBroker for many workers
+SUBSCRIPTIONS_BROKER = env('SUBSCRIPTIONS_BROKER', default='checkBalance.pubsub.InProcessBroker')
+SUBSCRIPTIONS_REDIS_URL = env('SUBSCRIPTIONS_REDIS_URL', default='redis://localhost:6379/0')
+# seconds between keep alive messages of subscription websockets
+SUBSCRIPTIONS_KEEP_ALIVE = 30
+# rows fetched by one query of transactions export
+EXPORT_CHUNK_SIZE = 2000
+# rows inserted by one query of transactions import
+IMPORT_CHUNK_SIZE = 1000
+# max number of rejected rows listed in import report
+IMPORT_MAX_REJECTS = 1000
+
 
 AUTHENTICATION_BACKENDS = [
     'graphql_jwt.backends.JSONWebTokenBackend',
@@ -108,6 +146,13 @@ GRAPHQL_JWT = {
     'JWT_ALGORITHM': 'HS256',
 }
 
+# seconds to keep user of decoded token, never longer than token expiration
+JWT_USER_CACHE_TTL = 60
+# max number of tokens in in-process cache
+JWT_USER_CACHE_SIZE = 10000
+# name of cache in CACHES shared by workers, in-process cache is used if not set
+JWT_USER_CACHE_ALIAS = env('JWT_USER_CACHE_ALIAS', default=None)
+
 PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.Argon2PasswordHasher',
     'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
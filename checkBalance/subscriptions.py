@@ -0,0 +1,243 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from graphene_django.views import GraphQLView
+from graphql.execution import ExecutionResult
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.settings import jwt_settings
+from promise import is_thenable
+from rx import Observable
+from rx.subjects import Subject
+
+from checkBalance import pubsub
+from checkBalance.backend import document_backend
+from checkBalance.middleware import get_token_user
+from checkBalance.schema import schema
+from checkBalance.views import run_in_pool
+
+
+GRAPHQL_WS = 'graphql-ws'
+GRAPHQL_PATHS = ('/graphql/', '/graphql')
+
+
+class SubscriptionContext:
+    '''Context of operations of one websocket, like request of http view'''
+
+    def __init__(self):
+        self.user = AnonymousUser()
+        self.events = Subject()
+        self.loaders = None
+
+
+def format_result(result):
+    data = result.data
+
+    if isinstance(data, dict):
+        # fields batched with loaders are still promises
+        data = {key: value.get() if is_thenable(value) else value
+                for key, value in data.items()}
+
+    payload = {'data': data}
+    if result.errors:
+        payload['errors'] = [GraphQLView.format_error(error) for error in result.errors]
+    return payload
+
+
+class GraphQLWebSocket:
+    '''
+    Serves graphql subscriptions of one websocket with graphql-ws
+    protocol of subscriptions-transport-ws. Client authenticates with
+    {"authorization": "Bearer <token>"} payload of connection_init.
+    Change events of the user come from checkBalance.pubsub to event loop
+    and are pushed to context.events in graphql thread pool, so resolvers
+    run their queries there like in AsyncBudgetGraphQLView.
+    '''
+
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.context = SubscriptionContext()
+        self.operations = {}
+        self.results = []
+        self.events = asyncio.Queue()
+        self.lock = asyncio.Lock()
+        self.unsubscribe = None
+        self.tasks = []
+
+    async def run(self):
+        message = await self.receive()
+        if message['type'] != 'websocket.connect':
+            return
+
+        if GRAPHQL_WS not in self.scope.get('subprotocols', []):
+            await self.send({'type': 'websocket.close', 'code': 1002})
+            return
+
+        await self.send({'type': 'websocket.accept', 'subprotocol': GRAPHQL_WS})
+
+        try:
+            while True:
+                message = await self.receive()
+
+                if message['type'] == 'websocket.disconnect':
+                    break
+
+                if not await self.handle(message.get('text') or message.get('bytes')):
+                    await self.send({'type': 'websocket.close', 'code': 1000})
+                    break
+        finally:
+            await self.close()
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+
+        if self.unsubscribe is not None:
+            self.unsubscribe()
+
+        for subscription in self.operations.values():
+            subscription.dispose()
+        self.operations.clear()
+
+    async def send_message(self, type, id=None, payload=None):
+        message = {'type': type}
+        if id is not None:
+            message['id'] = id
+        if payload is not None:
+            message['payload'] = payload
+        await self.send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    async def handle(self, text):
+        '''Handles client message, returns False if connection should be closed'''
+        try:
+            message = json.loads(text)
+            type = message.get('type')
+        except (TypeError, ValueError, AttributeError):
+            await self.send_message('error', payload={'message': 'Message must be JSON object.'})
+            return True
+
+        id = message.get('id')
+        payload = message.get('payload') or {}
+
+        if type == 'connection_init':
+            return await self.init(payload)
+
+        if type == 'connection_terminate':
+            return False
+
+        if type == 'start':
+            await self.start(id, payload)
+        elif type == 'stop':
+            await self.stop(id)
+        else:
+            await self.send_message('error', id, {'message': 'Unknown message type.'})
+
+        return True
+
+    async def init(self, payload):
+        authorization = payload.get('authorization') if isinstance(payload, dict) else None
+
+        if authorization:
+            prefix, _, token = authorization.partition(' ')
+
+            if prefix.lower() != jwt_settings.JWT_AUTH_HEADER_PREFIX.lower():
+                await self.send_message('connection_error',
+                                        payload={'message': 'Invalid authorization.'})
+                return False
+
+            try:
+                user = await run_in_pool(get_token_user, token)
+            except JSONWebTokenError as e:
+                await self.send_message('connection_error', payload={'message': str(e)})
+                return False
+
+            if user is not None:
+                self.context.user = user
+
+        if self.context.user.is_authenticated and self.unsubscribe is None:
+            loop = asyncio.get_running_loop()
+            self.unsubscribe = pubsub.subscribe(
+                self.context.user.pk,
+                lambda event: loop.call_soon_threadsafe(self.events.put_nowait, event))
+            self.tasks.append(asyncio.ensure_future(self.deliver_events()))
+
+        await self.send_message('connection_ack')
+
+        if settings.SUBSCRIPTIONS_KEEP_ALIVE:
+            await self.send_message('ka')
+            self.tasks.append(asyncio.ensure_future(self.keep_alive()))
+
+        return True
+
+    async def keep_alive(self):
+        while True:
+            await asyncio.sleep(settings.SUBSCRIPTIONS_KEEP_ALIVE)
+            await self.send_message('ka')
+
+    async def start(self, id, payload):
+        if id is None or id in self.operations:
+            await self.send_message('error', id, {'message': 'Operation id is missing or used.'})
+            return
+
+        async with self.lock:
+            result = await run_in_pool(self.execute, id, payload)
+
+        if isinstance(result, ExecutionResult):
+            # query, mutation or invalid operation
+            await self.send_message('data', id, format_result(result))
+            await self.send_message('complete', id)
+
+    def execute(self, id, payload):
+        result = schema.execute(payload.get('query'),
+                                variable_values=payload.get('variables'),
+                                operation_name=payload.get('operationName'),
+                                context_value=self.context,
+                                backend=document_backend,
+                                allow_subscriptions=True)
+
+        if isinstance(result, Observable):
+            self.operations[id] = result.subscribe(
+                lambda result: self.results.append((id, format_result(result))))
+            return None
+
+        return result
+
+    async def stop(self, id):
+        subscription = self.operations.pop(id, None)
+
+        if subscription is not None:
+            subscription.dispose()
+
+        await self.send_message('complete', id)
+
+    async def deliver_events(self):
+        while True:
+            event = await self.events.get()
+
+            async with self.lock:
+                results = await run_in_pool(self.push_event, event)
+
+            for id, payload in results:
+                await self.send_message('data', id, payload)
+
+    def push_event(self, event):
+        '''Runs subscription resolvers for event, returns (id, payload) list'''
+        # loaders cache rows, so they should not live longer than one event
+        self.context.loaders = None
+        self.context.events.on_next(event)
+
+        results, self.results = self.results, []
+        return results
+
+
+async def websocket_application(scope, receive, send):
+    '''ASGI application of graphql websockets'''
+    if scope['path'] not in GRAPHQL_PATHS:
+        await receive()
+        await send({'type': 'websocket.close', 'code': 1000})
+        return
+
+    await GraphQLWebSocket(scope, receive, send).run()
@@ -2,13 +2,22 @@ from django.urls import path, include
 from django.contrib import admin
 from django.conf import settings
 
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
 
+from budget.views import export_transactions, import_transactions
+from checkBalance.views import AsyncBudgetGraphQLView, BudgetGraphQLView
+
 # import debug_toolbar
 
+if settings.GRAPHQL_ASYNC:
+    graphql_view = AsyncBudgetGraphQLView.as_view(graphiql=True)
+else:
+    graphql_view = csrf_exempt(BudgetGraphQLView.as_view(graphiql=True))
+
 urlpatterns = [
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True)), name='graphql'),
-    path('graphql', csrf_exempt(GraphQLView.as_view(graphiql=True)), name='graphql'),
+    path('graphql/', graphql_view, name='graphql'),
+    path('graphql', graphql_view, name='graphql'),
+    path('export/transactions/', export_transactions, name='export-transactions'),
+    path('import/transactions/', import_transactions, name='import-transactions'),
     # path('__debug__/', include(debug_toolbar.urls)),
 ]
@@ -0,0 +1,313 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotModified
+from django.utils.http import parse_etags
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql.utils.get_operation_ast import get_operation_ast
+
+from checkBalance import idempotency, persisted_queries, response_cache
+from checkBalance.backend import document_backend
+
+
+class BudgetGraphQLView(GraphQLView):
+    '''
+    GraphQL view with automatic persisted queries.
+    Client can send sha256 of query in extensions.persistedQuery
+    instead of query text. Unknown hash is answered with
+    PersistedQueryNotFound, then client sends query with hash to register it.
+    Parsed and validated documents are reused from LRU cache.
+    Responses of queries are cached per user and data version.
+    GET queries get ETag of the same key and are answered with
+    304 Not Modified before execution if client has it.
+    POST body can be a list of operations, they are executed with one
+    shared request context and results are returned as a list.
+    Mutations with Idempotency-Key header or idempotencyKey argument are
+    executed once, repeated requests get stored response.
+    '''
+
+    def get_backend(self, request):
+        return document_backend
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.user.is_anonymous and getattr(request, 'jwt_error', None) is not None:
+            # invalid or expired token, see JSONWebTokenAuthenticationMiddleware
+            result = self.json_encode(request, {'errors': [self.format_error(request.jwt_error)]})
+            return HttpResponse(result, content_type='application/json')
+
+        etag = self.get_etag(request)
+
+        if etag is not None and etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+
+        if etag is not None and getattr(request, 'cacheable_response', False):
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+
+        if getattr(request, 'idempotent_replay', False):
+            response['Idempotent-Replayed'] = 'true'
+
+        return response
+
+    def parse_body(self, request):
+        if self.get_content_type(request) == 'application/json' \
+                and request.body.lstrip()[:1] == b'[':
+            # view instance is created per request, so batch mode is per request too
+            self.batch = True
+
+        data = super().parse_body(request)
+
+        if self.batch and len(data) > settings.GRAPHQL_MAX_BATCH_SIZE:
+            raise HttpError(HttpResponseBadRequest(
+                'Batch size is limited to %s operations.' % settings.GRAPHQL_MAX_BATCH_SIZE))
+
+        return data
+
+    def get_etag(self, request):
+        '''Returns strong ETag for GET query operations of authenticated user'''
+        if request.method != 'GET':
+            return None
+
+        try:
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return None
+            query, variables, operation_name, id = self.get_graphql_params(request, data)
+        except HttpError:
+            return None
+
+        cache_key = self.get_response_cache_key(request, query, variables, operation_name)
+
+        if cache_key is None:
+            return None
+
+        return '"%s"' % hashlib.sha256(cache_key.encode()).hexdigest()
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        cache_key = self.get_response_cache_key(request, query, variables, operation_name)
+        idempotency_key = self.get_idempotency_key(request, query, variables, operation_name)
+        response = None
+        status_code = 200
+
+        if cache_key is not None:
+            response = response_cache.get_response(cache_key)
+            if response is not None:
+                request.cacheable_response = True
+
+        if response is None and idempotency_key is not None:
+            with transaction.atomic():
+                response, status_code = self.get_idempotent_response(
+                    request, data, idempotency_key, query, variables, operation_name, show_graphiql)
+
+            if response is None:
+                return None, status_code
+
+        elif response is None:
+            response, status_code, errors = self.execute_response(
+                request, data, query, variables, operation_name, show_graphiql)
+
+            if response is None:
+                return None, status_code
+
+            if cache_key is not None and not errors:
+                request.cacheable_response = True
+                response_cache.set_response(cache_key, response)
+
+        if self.batch:
+            response = dict(response, id=id, status=status_code)
+
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+    def execute_response(self, request, data, query, variables, operation_name, show_graphiql):
+        '''Executes operation, returns (response dict, status code, has errors)'''
+        # loaders cache rows, operations of a batch should not see rows of previous ones
+        request.loaders = None
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        if not execution_result:
+            return None, 200, False
+
+        response = {}
+        status_code = 200
+
+        if execution_result.errors:
+            set_rollback()
+            response['errors'] = [self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.invalid:
+            status_code = 400
+        else:
+            response['data'] = execution_result.data
+
+        return response, status_code, bool(execution_result.errors)
+
+    def get_idempotent_response(self, request, data, key, query, variables, operation_name,
+                                show_graphiql):
+        '''
+        Returns (response, status code) of mutation with idempotency key,
+        stored response if the key was used before. Should be called in
+        transaction.atomic(), key of mutation with errors is rolled back with it.
+        '''
+        hash = idempotency.request_hash(query, variables, operation_name)
+        stored = idempotency.claim(request.user, key, hash)
+
+        if stored is not None:
+            if stored.request_hash != hash:
+                return {'errors': [{'message': 'Idempotency key was used for another request.'}]}, 422
+
+            request.idempotent_replay = True
+            return json.loads(stored.response), 200
+
+        response, status_code, errors = self.execute_response(
+            request, data, query, variables, operation_name, show_graphiql)
+
+        if response is None or errors:
+            transaction.set_rollback(True)
+        else:
+            idempotency.save_response(request.user, key, json.dumps(response, separators=(',', ':')))
+
+        return response, status_code
+
+    def get_document(self, request, query):
+        '''Returns parsed and validated document or None if query is invalid'''
+        try:
+            return self.get_backend(request).document_from_string(self.schema, query)
+        except Exception:
+            return None
+
+    def get_response_cache_key(self, request, query, variables, operation_name):
+        '''Returns cache key for query operations of authenticated user'''
+        if not query or request.user.is_anonymous or response_cache.get_cache() is None:
+            return None
+
+        document = self.get_document(request, query)
+
+        if document is None or document.get_operation_type(operation_name) != 'query':
+            return None
+
+        return response_cache.response_key(request.user.pk, query, variables, operation_name)
+
+    def get_idempotency_key(self, request, query, variables, operation_name):
+        '''
+        Returns key of mutation of authenticated user from Idempotency-Key
+        header or idempotencyKey arguments. Header is ignored in batches,
+        operations of one batch should have their own keys in arguments.
+        '''
+        if not query or request.user.is_anonymous:
+            return None
+
+        document = self.get_document(request, query)
+
+        if document is None:
+            return None
+
+        operation = get_operation_ast(document.document_ast, operation_name)
+
+        if operation is None or operation.operation != 'mutation':
+            return None
+
+        return idempotency.get_idempotency_key(request, operation, variables,
+                                               use_header=not self.batch)
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+        sha256 = self.get_persisted_query_hash(request, data)
+        allowlist = persisted_queries.get_allowlist()
+
+        if sha256 is not None and not query:
+            query = persisted_queries.get_persisted_query(sha256)
+
+            if query is None:
+                raise HttpError(HttpResponse(status=200), 'PersistedQueryNotFound')
+
+        elif sha256 is not None:
+            if persisted_queries.query_hash(query) != sha256:
+                raise HttpError(HttpResponseBadRequest('Provided sha256 does not match query.'))
+
+            if allowlist is None:
+                persisted_queries.save_persisted_query(sha256, query)
+
+        elif query and allowlist is not None:
+            sha256 = persisted_queries.query_hash(query)
+
+        if allowlist is not None and query and sha256 not in allowlist:
+            raise HttpError(HttpResponseBadRequest('Query is not allowed.'))
+
+        return query, variables, operation_name, id
+
+    @staticmethod
+    def get_persisted_query_hash(request, data):
+        extensions = request.GET.get('extensions') or data.get('extensions')
+
+        if not extensions:
+            return None
+
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest('Extensions are invalid JSON.'))
+
+        persisted_query = extensions.get('persistedQuery') or {}
+
+        return persisted_query.get('sha256Hash')
+
+
+graphql_executor = ThreadPoolExecutor(max_workers=settings.GRAPHQL_ASYNC_THREADS,
+                                      thread_name_prefix='graphql')
+
+
+def run_with_connection(func, *args, **kwargs):
+    '''Runs func like a request, db connection of thread is closed when it is too old'''
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(func, *args, **kwargs):
+    '''Awaits sync func executed in bounded graphql thread pool'''
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, run_with_connection, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(graphql_executor, call)
+
+
+class AsyncBudgetGraphQLView(BudgetGraphQLView):
+    '''
+    BudgetGraphQLView for ASGI. Request is handled on event loop,
+    operations with their ORM resolvers are executed in graphql_executor,
+    so at most GRAPHQL_ASYNC_THREADS threads are busy and waiting
+    clients hold no thread. Django 3.2 has no async ORM, so resolvers
+    stay sync and whole request takes one thread hop instead of one
+    per field; loaders keep batching inside the thread.
+    '''
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            return await run_in_pool(view, request, *args, **kwargs)
+
+        functools.update_wrapper(async_view, view)
+        async_view.csrf_exempt = True
+        return async_view
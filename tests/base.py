@@ -0,0 +1,25 @@
+from django.core.cache import cache
+from django.test import TestCase
+from graphql_jwt.shortcuts import get_token
+
+from users import token_cache
+from users.models import CustomUser
+
+
+class UserSetUpMixin:
+    '''Clears caches and creates user with JWT before every test'''
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        token_cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email='user@test.com',
+            password='testpassword',
+            username='test_user'
+        )
+        self.token = get_token(self.user)
+
+
+class UserTestCase(UserSetUpMixin, TestCase):
+    '''TestCase with authenticated user, see UserSetUpMixin'''
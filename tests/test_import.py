@@ -0,0 +1,134 @@
+import datetime
+import tempfile
+from io import StringIO
+from urllib.parse import urlencode
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from budget import rollups
+from budget.models import Category as CategoryModel
+from budget.models import Month as MonthModel
+from budget.models import Transaction as TransactionModel
+from tests.base import UserTestCase
+
+
+class ImportViewTest(UserTestCase):
+    '''Tests for import of bank statements'''
+
+    def setUp(self):
+        super().setUp()
+        self.category = CategoryModel.objects.create(user=self.user, name='Food')
+
+    def upload(self, name, content, **params):
+        file = SimpleUploadedFile(name, content.encode())
+        return self.client.post('/import/transactions/?%s' % urlencode(params), {'file': file},
+                                HTTP_AUTHORIZATION='Bearer %s' % self.token)
+
+    def test_csv(self):
+        response = self.upload('statement.csv',
+                               'Date,Amount,Description,Category\n'
+                               '2021-01-05,-12.50,Shop,Food\n'
+                               '2021-02-01,1000,Salary,Job\n'
+                               'yesterday,10,Broken,\n'
+                               '2021-02-03,-5,Bus,\n')
+
+        report = response.json()
+        self.assertEqual(report['rows'], 4)
+        self.assertEqual(report['imported'], 3)
+        self.assertEqual(report['rejects'], [{'line': 4, 'message': 'Invalid date: yesterday.'}])
+
+        shop = TransactionModel.objects.get(description='Shop')
+        self.assertEqual((shop.amount, shop.group, shop.category, shop.created_at),
+                         (13, 'Expense', self.category, datetime.date(2021, 1, 5)))
+        self.assertEqual((shop.month.year, shop.month.month), (2021, 0))
+
+        salary = TransactionModel.objects.get(description='Salary')
+        self.assertEqual((salary.group, salary.category.name), ('Income', 'Job'))
+
+        self.assertEqual(MonthModel.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(rollups.find_drift(), [])
+
+    def test_duplicates(self):
+        statement = ('date,amount,description\n'
+                     '2021-01-05,-3,Coffee\n'
+                     '2021-01-05,-3,Coffee\n')
+        self.upload('statement.csv', statement)
+
+        # same rows of one statement are not duplicates
+        self.assertEqual(TransactionModel.objects.count(), 2)
+
+        report = self.upload('statement.csv', statement + '2021-01-06,-4,Tea\n').json()
+        self.assertEqual((report['imported'], report['duplicates']), (1, 2))
+        self.assertEqual(report['rejects'], [{'line': 2, 'message': 'Duplicate transaction.'},
+                                             {'line': 3, 'message': 'Duplicate transaction.'}])
+
+        report = self.upload('statement.csv', statement, duplicates='keep').json()
+        self.assertEqual((report['imported'], report['duplicates']), (2, 2))
+        self.assertEqual(TransactionModel.objects.count(), 5)
+
+    def test_chunks(self):
+        rows = ''.join('2021-01-%02d,-%s,Item\n' % (day, day) for day in range(1, 8))
+
+        with override_settings(IMPORT_CHUNK_SIZE=3), CaptureQueriesContext(connection) as queries:
+            self.upload('statement.csv', 'date,amount,description\n' + rows)
+
+        inserts = [query for query in queries
+                   if query['sql'].startswith('INSERT INTO "budget_transaction"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(TransactionModel.objects.count(), 7)
+
+    def test_qif(self):
+        self.upload('statement.qif',
+                    '!Type:Bank\n'
+                    "D1/5'21\nT-12.00\nPShop\nLFood\n^\n"
+                    'D01/06/2021\nT50\nPRefund\n^\n')
+
+        self.assertEqual(
+            list(TransactionModel.objects.order_by('created_at')
+                 .values_list('created_at', 'amount', 'group', 'category__name')),
+            [(datetime.date(2021, 1, 5), 12, 'Expense', 'Food'),
+             (datetime.date(2021, 1, 6), 50, 'Income', None)])
+
+    def test_ofx(self):
+        response = self.upload(
+            'statement.ofx',
+            'OFXHEADER:100\nDATA:OFXSGML\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>'
+            '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20210105120000[0:GMT]<TRNAMT>-12.00'
+            '<NAME>Shop<MEMO>Card</STMTTRN>'
+            '<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20210107<TRNAMT>x</STMTTRN>'
+            '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>')
+
+        self.assertEqual(response.json()['rejects'], [{'line': 2, 'message': 'Invalid amount: x.'}])
+        transaction = TransactionModel.objects.get()
+        self.assertEqual((transaction.description, transaction.amount, transaction.created_at),
+                         ('Shop Card', 12, datetime.date(2021, 1, 5)))
+
+    def test_unauthorized(self):
+        file = SimpleUploadedFile('statement.csv', b'date,amount\n')
+        response = self.client.post('/import/transactions/', {'file': file})
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.upload('statement.txt', '').status_code, 400)
+
+
+class ImportCommandTest(UserTestCase):
+    '''Tests for import_transactions command'''
+
+    def test_import_transactions_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as file:
+            file.write('date,amount,description\n2021-03-01,-7,Coffee\n2021-03-02,0,Empty\n')
+            file.flush()
+
+            out = StringIO()
+            call_command('import_transactions', 'user@test.com', file.name, stdout=out)
+
+        self.assertIn('line 3: Amount is zero.', out.getvalue())
+        self.assertIn('Imported 1 of 2 rows', out.getvalue())
+        self.assertTrue(TransactionModel.objects.filter(
+            user=self.user, description='Coffee', amount=7, group='Expense').exists())
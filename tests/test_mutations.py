@@ -1,7 +1,12 @@
 from collections import OrderedDict
+from io import StringIO
 from django.test import RequestFactory, TestCase
-from unittest import skip
+from unittest import mock, skip
 from django.core.exceptions import ValidationError
+from django.core.management import call_command, CommandError
+from django.db import IntegrityError, connection
+from django.db.transaction import atomic
+from django.test.utils import CaptureQueriesContext
 from graphene.test import Client
 
 from users.models import CustomUser
@@ -9,6 +14,9 @@ from budget.models import Transaction as TransactionModel
 from budget.models import Category as CategoryModel
 from budget.models import Month as MonthModel
 from budget.models import Plan as PlanModel
+from budget.models import TransactionRollup
+from budget import rollups
+from budget.upserts import insert_or_get
 from checkBalance.schema import schema
 
 
@@ -225,6 +233,119 @@ class QueryTest(TestCase):
         data = executed.get('data')
         self.assertEqual(data, expected)
 
+    def test_create_transactions_mutation_ids(self):
+        query = '''
+            mutation {
+                createTransactions(transactions:
+                [{amount:100, month:200, group:Expense},
+                {amount:200, month:200, group:Income},
+                ]) {
+                    transactions {
+                        id
+                        amount
+                    }
+                }
+            }
+                '''
+
+        executed = execute_query(query, self.user)
+        transactions = executed['data']['createTransactions']['transactions']
+
+        for transaction in transactions:
+            self.assertEqual(TransactionModel.objects.get(id=transaction['id']).amount,
+                             transaction['amount'])
+
+    def test_create_transactions_mutation_errors(self):
+        query = '''
+            mutation {
+                createTransactions(transactions:
+                [{amount:100, month:201, group:Expense},
+                {amount:200, month:200, category:300, group:Savings},
+                {month:200, group:Income},
+                ]) {
+                    transactions {
+                        amount
+                        group
+                    }
+                    errors {
+                        index
+                        message
+                    }
+                }
+            }
+                '''
+
+        expected = {'createTransactions': {
+            'transactions': [{'amount': 200, 'group': 'SAVINGS'}],
+            'errors': [{'index': 0, 'message': 'Month not found.'},
+                       {'index': 2, 'message': 'Missing fields: amount.'}]}}
+
+        executed = execute_query(query, self.user)
+        data = executed.get('data')
+        self.assertEqual(data, expected)
+
+    def test_create_transactions_mutation_query_count(self):
+        query = '''
+            mutation ($transactions: [TransactionInput]) {
+                createTransactions(transactions: $transactions) {
+                    errors {
+                        index
+                    }
+                }
+            }
+                '''
+
+        def count_queries(size):
+            # amounts differ between calls, so items are not duplicates
+            transactions = [{'amount': size * 1000 + i, 'month': 200, 'category': 300,
+                             'group': 'Expense'}
+                            for i in range(size)]
+            with CaptureQueriesContext(connection) as context:
+                execute_query(query, self.user, variable_values={
+                    'transactions': transactions})
+            return len(context.captured_queries)
+
+        # first call creates rollup row
+        count_queries(1)
+
+        self.assertEqual(count_queries(5), count_queries(50))
+        self.assertEqual(TransactionModel.objects.filter(
+            user=self.user, category=self.category).count(), 57)
+
+    def test_create_transactions_mutation_duplicates(self):
+        query = '''
+            mutation ($onDuplicate: DuplicateAction) {
+                createTransactions(transactions:
+                [{amount:10, month:200, group:Expense, description:"Coffee  shop"},
+                {amount:20, month:200, group:Expense, description:"Bus"},
+                ], onDuplicate: $onDuplicate) {
+                    transactions {
+                        amount
+                    }
+                    duplicates
+                    skipped
+                }
+            }
+                '''
+
+        executed = execute_query(query, self.user)
+        self.assertEqual(executed['data']['createTransactions'], {
+            'transactions': [{'amount': 10}, {'amount': 20}], 'duplicates': [], 'skipped': []})
+
+        # retry of the same request
+        executed = execute_query(query.replace('Coffee  shop', 'coffee shop '), self.user,
+                                 variable_values={'onDuplicate': 'SKIP'})
+        self.assertEqual(executed['data']['createTransactions'], {
+            'transactions': [], 'duplicates': [0, 1], 'skipped': [0, 1]})
+
+        # the same purchases again are created by default
+        executed = execute_query(query, self.user)
+        self.assertEqual(executed['data']['createTransactions'], {
+            'transactions': [{'amount': 10}, {'amount': 20}], 'duplicates': [0, 1], 'skipped': []})
+
+        self.assertEqual(TransactionModel.objects.filter(
+            user=self.user, description='Bus').count(), 2)
+
     def test_update_transaction_mutation(self):
         query = '''
                 mutation {
@@ -305,6 +426,38 @@ class QueryTest(TestCase):
         data = executed.get('data')
         self.assertEqual(data, expected)
 
+    def test_create_existing_category_mutation(self):
+        query = '''
+            mutation {
+                createCategory(name:"Dogs", color:"red") {
+                    name
+                }
+            }
+                '''
+
+        executed = execute_query(query, self.user)
+        self.assertEqual(executed.get('data'), {'createCategory': None})
+        self.assertEqual(CategoryModel.objects.filter(user=self.user, name='Dogs').count(), 1)
+
+    def test_insert_or_get_conflict(self):
+        # row inserted by concurrent request after the lookup of mutation
+        month, created = insert_or_get(
+            MonthModel(user=self.user, year=2021, month=1, change_seq=10),
+            ['user', 'year', 'month'])
+
+        self.assertFalse(created)
+        self.assertEqual(month.id, 200)
+
+        category, created = insert_or_get(
+            CategoryModel(user=self.user, name='Cats', change_seq=11), ['user', 'name'])
+
+        self.assertTrue(created)
+        self.assertEqual(category.name, 'Cats')
+
+    def test_unique_month(self):
+        with self.assertRaises(IntegrityError), atomic():
+            MonthModel.objects.create(user=self.user, year=2021, month=1)
+
     def test_update_category_mutation(self):
         query = '''
             mutation {
@@ -322,6 +475,21 @@ class QueryTest(TestCase):
         data = executed.get('data')
         self.assertEqual(data, expected)
 
+    def test_update_category_name_taken_concurrently(self):
+        query = 'mutation { updateCategory(id:300, name:"Deposit") { name } }'
+
+        def next_change(user):
+            # category with the name is created by concurrent request after the lookup
+            CategoryModel.objects.create(user=user, name='Deposit', change_seq=50)
+            return 51
+
+        with mock.patch('budget.mutations.categories.next_change', next_change):
+            executed = execute_query(query, self.user)
+
+        self.assertNotIn('errors', executed)
+        self.assertEqual(executed.get('data'), {'updateCategory': None})
+        self.assertEqual(CategoryModel.objects.filter(user=self.user, name='Deposit').count(), 1)
+
     def test_delete_category_mutation(self):
         query = '''
             mutation {
@@ -360,6 +528,21 @@ class QueryTest(TestCase):
         data = executed.get('data')
         self.assertEqual(data, expected)
 
+    def test_create_existing_month_mutation(self):
+        query = '''
+            mutation {
+                createMonth(month:1, year:2021, startMonthBalance:5) {
+                    id
+                    startMonthBalance
+                }
+            }
+                '''
+
+        executed = execute_query(query, self.user)
+        self.assertEqual(executed.get('data'),
+                         {'createMonth': {'id': '200', 'startMonthBalance': 100}})
+        self.assertEqual(MonthModel.objects.filter(user=self.user).count(), 1)
+
     @skip('works')
     def test_create_month_mutation_validation(self):
         query = '''
@@ -442,3 +625,130 @@ class QueryTest(TestCase):
         executed = execute_query(query, self.user)
         data = executed.get('data')
         self.assertEqual(data, expected)
+
+    def test_transaction_mutations_update_rollups(self):
+        rollups.rebuild()
+
+        query = '''
+            mutation {
+                createTransaction(amount:100, group:Income, month:200, category:300) {
+                    id
+                }
+                updateTransaction(id:400, amount:50, category:301) {
+                    id
+                }
+                applyTransactionsUpdates(actions: [
+                    {type:create, data:{amount:10, month:200, group:Expense}},
+                    {type:delete, data:{id:400}},
+                ]) {
+                    transactions {
+                        id
+                    }
+                }
+            }
+                '''
+
+        executed = execute_query(query, self.user)
+        self.assertNotIn('errors', executed)
+        self.assertEqual(rollups.find_drift(), [])
+
+        created = executed['data']['applyTransactionsUpdates']['transactions'][0]
+        self.assertEqual(TransactionModel.objects.get(id=created['id']).amount, 10)
+
+        expense = TransactionRollup.objects.get(
+            user=self.user, month=self.month, category=None, group='Expense')
+        self.assertEqual((expense.total, expense.count), (10, 1))
+        self.assertFalse(TransactionRollup.objects.filter(
+            category=self.category1).exists())
+
+    def test_apply_transactions_updates_mutation(self):
+        query = '''
+            mutation {
+                applyTransactionsUpdates(actions: [
+                    {type:update, data:{id:400, amount:5, category:301}},
+                    {type:create, data:{amount:10, month:200, group:Income}},
+                    {type:update, data:{id:401, amount:5}},
+                    {type:delete, data:{id:400}},
+                    {type:delete, data:{id:400}},
+                ]) {
+                    transactions {
+                        amount
+                        category {
+                            id
+                        }
+                    }
+                    errors {
+                        index
+                        message
+                    }
+                }
+            }
+                '''
+
+        expected = {'applyTransactionsUpdates': {
+            'transactions': [{'amount': 5, 'category': {'id': '301'}},
+                             {'amount': 10, 'category': None},
+                             None],
+            'errors': [{'index': 2, 'message': 'Transaction not found.'},
+                       {'index': 4, 'message': 'Transaction not found.'}]}}
+
+        executed = execute_query(query, self.user)
+        data = executed.get('data')
+        self.assertEqual(data, expected)
+        self.assertFalse(TransactionModel.objects.filter(id=400).exists())
+        self.assertEqual(TransactionModel.objects.get(id=401).amount, 1000)
+
+    def test_delete_category_moves_rollups(self):
+        rollups.rebuild()
+
+        query = '''
+            mutation {
+                deleteCategory(id:300) {
+                    id
+                }
+            }
+                '''
+
+        execute_query(query, self.user)
+        self.assertEqual(rollups.find_drift(), [])
+
+    def test_delete_locks_counter_before_rollups(self):
+        rollups.rebuild()
+
+        def first_write(queries, table):
+            return next(i for i, query in enumerate(queries)
+                        if query['sql'].startswith(('UPDATE', 'INSERT', 'DELETE'))
+                        and table in query['sql'].split(' WHERE ')[0])
+
+        for mutation in ('deleteCategory(id:300) { id }', 'deleteTransaction(id:400) { id }'):
+            with CaptureQueriesContext(connection) as context:
+                execute_query('mutation { %s }' % mutation, self.user)
+
+            queries = context.captured_queries
+            self.assertLess(first_write(queries, 'budget_changecounter'),
+                            first_write(queries, 'budget_transactionrollup'))
+
+    def test_rollups_skip_unknown_group(self):
+        transaction = TransactionModel.objects.create(
+            user=self.user, month=self.month, amount=5, group='Morning coffee')
+        rollups.rebuild()
+
+        self.assertFalse(TransactionRollup.objects.filter(group='Morning coffee').exists())
+
+        query = '''
+            mutation {
+                deleteTransaction(id:%s) {
+                    id
+                }
+            }
+                ''' % transaction.id
+
+        execute_query(query, self.user)
+        self.assertEqual(rollups.find_drift(), [])
+
+    def test_rebuild_rollups_command(self):
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--check', stdout=StringIO())
+
+        call_command('rebuild_rollups', stdout=StringIO())
+        call_command('rebuild_rollups', '--check', stdout=StringIO())
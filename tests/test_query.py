@@ -1,3 +1,10 @@
+import base64
+import datetime
+import json
+from io import StringIO
+
+import graphene
+from django.core.management import call_command
 from django.test import RequestFactory, TestCase
 from unittest import skip
 from graphql import GraphQLError
@@ -8,6 +15,8 @@ from budget.models import Transaction as TransactionModel
 from budget.models import Category as CategoryModel
 from budget.models import Month as MonthModel
 from budget.models import Plan as PlanModel
+from budget import explain, rollups
+from budget.schema.transactions import Transaction
 from checkBalance.schema import schema
 
 
@@ -149,6 +158,24 @@ class QueryTest(TestCase):
         data = executed.get('data')
         self.assertEqual(data, expected)
 
+    def test_month_by_date_query(self):
+        query = '''
+            query {
+                monthByDate(year:2021, month:1) {
+                    id
+                }
+                missing: monthByDate(year:2021, month:2) {
+                    id
+                }
+            }
+                '''
+
+        expected = {'monthByDate': {'id': '200'}, 'missing': None}
+
+        executed = execute_query(query, self.user)
+        data = executed.get('data')
+        self.assertEqual(data, expected)
+
     def test_category_query(self):
         query = '''
             query {
@@ -290,3 +317,540 @@ class QueryTest(TestCase):
         executed = execute_query(query, self.user)
         data = executed.get('data')
         self.assertEqual(data, expected)
+
+    def test_transactions_connection_query(self):
+        for i in range(4):
+            TransactionModel.objects.create(
+                id=410 + i,
+                user=self.user,
+                month=self.month,
+                amount=i,
+                group='Income'
+            )
+
+        query = '''
+            query ($after: String) {
+                transactionsConnection(first:2, after:$after) {
+                    edges {
+                        cursor
+                        node {
+                            id
+                        }
+                    }
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
+                }
+            }
+                '''
+
+        ids = []
+        after = None
+        has_next_page = True
+
+        while has_next_page:
+            executed = execute_query(query, self.user,
+                                     variable_values={'after': after})
+            page = executed.get('data')['transactionsConnection']
+            self.assertLessEqual(len(page['edges']), 2)
+            ids += [edge['node']['id'] for edge in page['edges']]
+            has_next_page = page['pageInfo']['hasNextPage']
+            after = page['pageInfo']['endCursor']
+
+        self.assertEqual(ids, ['400', '410', '411', '412', '413'])
+
+    def test_transactions_connection_invalid_cursor(self):
+        query = '''
+            query {
+                transactionsConnection(after:"invalid") {
+                    edges {
+                        cursor
+                    }
+                }
+            }
+                '''
+
+        executed = execute_query(query, self.user)
+        errors = executed.get('errors')[0]['message']
+        self.assertEqual(errors, 'Invalid cursor.')
+
+    def test_transactions_connection_tampered_cursor(self):
+        cursor = base64.urlsafe_b64encode(json.dumps(['abc', '1']).encode()).decode()
+        query = '''
+            query {
+                transactionsConnection(after:"%s") {
+                    edges {
+                        cursor
+                    }
+                }
+            }
+                ''' % cursor
+
+        executed = execute_query(query, self.user)
+        errors = executed.get('errors')[0]['message']
+        self.assertEqual(errors, 'Invalid cursor.')
+
+    def test_plans_connection_query(self):
+        query = '''
+            query {
+                plansConnection(month:200) {
+                    edges {
+                        node {
+                            id
+                            plannedAmount
+                        }
+                    }
+                    pageInfo {
+                        hasNextPage
+                    }
+                }
+            }
+                '''
+
+        expected = {'plansConnection': {
+            'edges': [{'node': {'id': '500', 'plannedAmount': 10}}],
+            'pageInfo': {'hasNextPage': False}}}
+
+        executed = execute_query(query, self.user)
+        data = executed.get('data')
+        self.assertEqual(data, expected)
+
+    def test_months_connection_query(self):
+        MonthModel.objects.create(id=202, user=self.user, month=0, year=2021)
+
+        query = '''
+            query ($after: String) {
+                monthsConnection(first:1, after:$after) {
+                    edges {
+                        node {
+                            id
+                        }
+                    }
+                    pageInfo {
+                        endCursor
+                    }
+                }
+            }
+                '''
+
+        executed = execute_query(query, self.user)
+        page = executed.get('data')['monthsConnection']
+        self.assertEqual(page['edges'], [{'node': {'id': '202'}}])
+
+        executed = execute_query(query, self.user, variable_values={
+            'after': page['pageInfo']['endCursor']})
+        page = executed.get('data')['monthsConnection']
+        self.assertEqual(page['edges'], [{'node': {'id': '200'}}])
+
+    def test_month_summary_query(self):
+        TransactionModel.objects.create(
+            user=self.user, month=self.month, amount=3000, group='Income')
+        TransactionModel.objects.create(
+            user=self.user, month=self.month, amount=500, group='Savings')
+        rollups.rebuild([self.user])
+
+        query = '''
+            query {
+                monthSummary(month:200) {
+                    income
+                    expense
+                    savings
+                    closingBalance
+                    closingSavings
+                    categories {
+                        category
+                        name
+                        group
+                        total
+                    }
+                }
+            }
+                '''
+
+        expected = {'monthSummary': {
+            'income': 3000,
+            'expense': 1000,
+            'savings': 500,
+            'closingBalance': 1600,
+            'closingSavings': 600,
+            'categories': [
+                {'category': '300', 'name': 'Dogs', 'group': 'Expense', 'total': 1000},
+                {'category': None, 'name': None, 'group': 'Income', 'total': 3000},
+                {'category': None, 'name': None, 'group': 'Savings', 'total': 500}]}}
+
+        with self.assertNumQueries(1):
+            executed = execute_query(query, self.user)
+        data = executed.get('data')
+        self.assertEqual(data, expected)
+
+    def test_month_summary_unknown_group(self):
+        TransactionModel.objects.create(
+            user=self.user, month=self.month, amount=3000, group='Income')
+        # group is not one of choices
+        TransactionModel.objects.create(
+            user=self.user, month=self.month, amount=500, group='coffee')
+        rollups.rebuild([self.user])
+
+        query = '''
+            query {
+                monthSummary(month:200) {
+                    income
+                    expense
+                    closingBalance
+                    categories {
+                        group
+                        total
+                    }
+                }
+            }
+                '''
+
+        expected = {'monthSummary': {
+            'income': 3000,
+            'expense': 1000,
+            'closingBalance': 2100,
+            'categories': [
+                {'group': 'Expense', 'total': 1000},
+                {'group': 'Income', 'total': 3000}]}}
+
+        executed = execute_query(query, self.user)
+        self.assertNotIn('errors', executed)
+        self.assertEqual(executed.get('data'), expected)
+
+    def test_transaction_related_fields_are_batched(self):
+        category1 = CategoryModel.objects.create(user=self.user, name='Food')
+        month1 = MonthModel.objects.create(user=self.user, month=2, year=2021)
+
+        for i in range(10):
+            TransactionModel.objects.create(
+                user=self.user,
+                category=(self.category, category1)[i % 2],
+                month=(self.month, month1)[i % 2],
+                amount=i,
+                group='Expense'
+            )
+
+        class LoaderQuery(graphene.ObjectType):
+            # list without joins, like mutation outputs
+            transactions = graphene.List(Transaction)
+
+            def resolve_transactions(self, info):
+                return TransactionModel.objects.order_by('id')
+
+        query = '''
+            query {
+                transactions {
+                    category {
+                        name
+                    }
+                    month {
+                        month
+                    }
+                }
+            }
+                '''
+
+        context_value = RequestFactory().get('/graphql/')
+        context_value.user = self.user
+        client = Client(graphene.Schema(query=LoaderQuery))
+
+        # transactions, categories and months
+        with self.assertNumQueries(3):
+            executed = client.execute(query, context_value=context_value)
+
+        transactions = executed.get('data')['transactions']
+        self.assertEqual(len(transactions), 11)
+        self.assertEqual(transactions[-1], {'category': {'name': 'Food'},
+                                            'month': {'month': 2}})
+
+    def test_plan_progress_query(self):
+        TransactionModel.objects.create(
+            user=self.user, category=self.category, month=self.month,
+            amount=500, group='Income')
+        rollups.rebuild([self.user])
+        self.plan.planned_amount = 4000
+        self.plan.save()
+
+        query = '''
+            query {
+                planProgress(month:200) {
+                    id
+                    plannedAmount
+                    spent
+                    remaining
+                    percentUsed
+                }
+            }
+                '''
+
+        expected = {'planProgress': [
+            {'id': '500', 'plannedAmount': 4000, 'spent': 1000,
+             'remaining': 3000, 'percentUsed': 25.0}]}
+
+        with self.assertNumQueries(1):
+            executed = execute_query(query, self.user)
+        data = executed.get('data')
+        self.assertEqual(data, expected)
+
+    def test_plan_spent_query(self):
+        rollups.rebuild([self.user])
+
+        query = '''
+            query {
+                plan(id:500) {
+                    spent
+                    remaining
+                }
+            }
+                '''
+
+        expected = {'plan': {'spent': 1000, 'remaining': -990}}
+
+        executed = execute_query(query, self.user)
+        data = executed.get('data')
+        self.assertEqual(data, expected)
+
+    def test_balance_series_query(self):
+        TransactionModel.objects.create(
+            user=self.user, month=self.month, amount=3000, group='Income')
+        TransactionModel.objects.create(
+            user=self.user, month=self.month, amount=500, group='Savings')
+        TransactionModel.objects.filter(id=400).update(created_at='2021-02-01')
+
+        query = '''
+            query {
+                balanceSeries(month:200) {
+                    balance
+                    savings
+                }
+            }
+                '''
+
+        expected = {'balanceSeries': [
+            {'balance': -900, 'savings': 100},
+            {'balance': 1600, 'savings': 600}]}
+
+        executed = execute_query(query, self.user)
+        data = executed.get('data')
+        self.assertEqual(data, expected)
+
+    def test_spending_series_query(self):
+        transaction = TransactionModel.objects.create(
+            user=self.user, category=self.category, month=self.month,
+            amount=500, group='Expense')
+        TransactionModel.objects.filter(id=400).update(created_at='2021-02-01')
+        TransactionModel.objects.filter(id=transaction.id).update(created_at='2021-02-20')
+
+        query = '''
+            query {
+                spendingSeries(from:"2021-01-01", to:"2021-12-31",
+                               bucket:MONTH, groupBy:CATEGORY) {
+                    date
+                    category
+                    total
+                    count
+                }
+            }
+                '''
+
+        expected = {'spendingSeries': [
+            {'date': '2021-02-01', 'category': '300', 'total': 1500, 'count': 2}]}
+
+        executed = execute_query(query, self.user)
+        data = executed.get('data')
+        self.assertEqual(data, expected)
+
+    def test_spending_series_income_and_expense(self):
+        TransactionModel.objects.filter(id=400).update(created_at='2021-01-10')
+        TransactionModel.objects.create(
+            user=self.user, category=self.category, month=self.month, amount=3000,
+            group='Income', created_at=datetime.date(2021, 1, 15))
+
+        query = '''
+            query {
+                spendingSeries(from:"2021-01-01", to:"2021-01-31",
+                               bucket:MONTH, groupBy:CATEGORY) {
+                    category
+                    group
+                    total
+                }
+            }
+                '''
+
+        expected = {'spendingSeries': [
+            {'category': '300', 'group': 'Expense', 'total': 1000},
+            {'category': '300', 'group': 'Income', 'total': 3000}]}
+
+        executed = execute_query(query, self.user)
+        self.assertEqual(executed.get('data'), expected)
+
+    def test_spending_series_buckets_limit(self):
+        query = '''
+            query {
+                spendingSeries(from:"2000-01-01", to:"2021-12-31",
+                               bucket:DAY, groupBy:GROUP) {
+                    total
+                }
+            }
+                '''
+
+        executed = execute_query(query, self.user)
+        errors = executed.get('errors')[0]['message']
+        self.assertEqual(errors, 'Too many buckets, max is 1000.')
+
+
+class ChangesTest(TestCase):
+    '''Tests for delta sync of changed rows'''
+
+    changes_query = '''
+        query changes($since: String) {
+            changes(since: $since) {
+                cursor
+                transactions { amount }
+                categories { name }
+                months { month }
+                plans { plannedAmount }
+                deleted { type id }
+            }
+        }'''
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='user@test.com',
+            password='testpassword',
+            username='test_user'
+        )
+        self.month = MonthModel.objects.create(user=self.user, month=1, year=2021)
+        self.category = CategoryModel.objects.create(user=self.user, name='Food')
+        self.transaction = TransactionModel.objects.create(
+            user=self.user, month=self.month, category=self.category,
+            group='Expense', amount=10)
+
+    def changes(self, since=None):
+        executed = execute_query(self.changes_query, self.user, {'since': since})
+        self.assertNotIn('errors', executed)
+        return executed['data']['changes']
+
+    def test_full_sync(self):
+        changes = self.changes()
+
+        self.assertEqual(changes['transactions'], [{'amount': 10}])
+        self.assertEqual(changes['categories'], [{'name': 'Food'}])
+        self.assertEqual(changes['months'], [{'month': 1}])
+        self.assertEqual(changes['deleted'], [])
+
+    def test_changes_since_cursor(self):
+        cursor = self.changes()['cursor']
+
+        execute_query('mutation { createTransaction(amount: 20, group: Income, month: %s) { id } }'
+                      % self.month.id, self.user)
+        execute_query('mutation { createPlan(category: %s, month: %s, plannedAmount: 100) { id } }'
+                      % (self.category.id, self.month.id), self.user)
+
+        changes = self.changes(cursor)
+        self.assertEqual(changes['transactions'], [{'amount': 20}])
+        self.assertEqual(changes['plans'], [{'plannedAmount': 100}])
+        self.assertEqual(changes['categories'], [])
+        self.assertEqual(changes['months'], [])
+
+        self.assertEqual(self.changes(changes['cursor'])['transactions'], [])
+
+    def test_deleted(self):
+        cursor = self.changes()['cursor']
+
+        execute_query('mutation { deleteCategory(id: %s) { id } }' % self.category.id, self.user)
+
+        changes = self.changes(cursor)
+        self.assertEqual(changes['deleted'], [{'type': 'CATEGORY', 'id': str(self.category.id)}])
+        # transaction became uncategorized
+        self.assertEqual(changes['transactions'], [{'amount': 10}])
+
+        execute_query('mutation { deleteTransaction(id: %s) { id } }'
+                      % self.transaction.id, self.user)
+
+        changes = self.changes(changes['cursor'])
+        self.assertEqual(changes['deleted'], [{'type': 'TRANSACTION', 'id': str(self.transaction.id)}])
+
+    def test_bulk_actions(self):
+        cursor = self.changes()['cursor']
+
+        execute_query('mutation { applyTransactionsUpdates(actions: ['
+                      '{type: update, data: {id: %s, amount: 30}}]) { errors { message } } }'
+                      % self.transaction.id, self.user)
+
+        self.assertEqual(self.changes(cursor)['transactions'], [{'amount': 30}])
+
+    def test_invalid_cursor(self):
+        executed = execute_query(self.changes_query, self.user, {'since': 'invalid'})
+
+        self.assertEqual(executed['errors'][0]['message'], 'Invalid cursor.')
+
+
+class QueryPlanTest(TestCase):
+    '''Tests for indexes of transactions resolvers, run EXPLAIN on seeded data'''
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='user@test.com',
+            password='testpassword',
+            username='test_user'
+        )
+        self.user1 = CustomUser.objects.create_user(
+            email='user1@test.com',
+            password='testpassword',
+            username='test_user1'
+        )
+
+        for user in (self.user, self.user1):
+            months = [MonthModel.objects.create(user=user, month=month, year=2021)
+                      for month in range(12)]
+            categories = [CategoryModel.objects.create(user=user, name='Category %s' % i)
+                          for i in range(5)]
+            TransactionModel.objects.bulk_create([
+                TransactionModel(
+                    user=user,
+                    month=months[i % 12],
+                    category=categories[i % 5] if i % 7 else None,
+                    group=TransactionModel.GROUP_CHOICES[i % 3][0],
+                    amount=i + 1,
+                    created_at=datetime.date(2021, i % 12 + 1, i % 28 + 1),
+                ) for i in range(500)])
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset, index in explain.hot_queries(self.user):
+            with self.subTest(name):
+                plan = explain.explain(queryset)
+                self.assertEqual(explain.plan_problems(plan, index), [], plan)
+
+    def test_sequential_scan_detected(self):
+        plan = explain.explain(TransactionModel.objects.filter(amount=10))
+
+        self.assertTrue(explain.scans_table(plan), plan)
+
+    def test_sqlite_plan_problems(self):
+        # plan of transactionsConnection(month) without transaction_user_month_idx
+        plan = ('5 0 0 SEARCH budget_transaction USING INDEX transaction_user_change_idx (user_id=?)\n'
+                '24 0 0 USE TEMP B-TREE FOR ORDER BY')
+
+        self.assertEqual(explain.plan_problems(plan, 'transaction_user_month_idx'),
+                         ['transaction_user_month_idx is not used', 'sort step'])
+
+    def test_postgresql_plan_problems(self):
+        plan = '''Limit  (cost=8.59..8.60 rows=1 width=64)
+  ->  Sort  (cost=8.59..8.60 rows=1 width=64)
+        Sort Key: created_at, id
+        ->  Bitmap Heap Scan on budget_transaction  (cost=8.57..8.58 rows=1 width=64)
+              ->  BitmapAnd  (cost=8.57..8.57 rows=1 width=0)
+                    ->  Bitmap Index Scan on budget_transaction_user_id_idx
+                    ->  Bitmap Index Scan on budget_transaction_month_id_idx'''
+
+        self.assertEqual(explain.plan_problems(plan, 'transaction_user_month_idx'), [
+            'transaction_user_month_idx is not used', 'sort step', 'BitmapAnd of indexes'])
+
+    def test_explain_hot_queries_command(self):
+        out = StringIO()
+        call_command('explain_hot_queries', 'user@test.com', stdout=out)
+
+        self.assertIn('transactionsConnection(month)', out.getvalue())
+        self.assertIn('All queries are served by their indexes.', out.getvalue())
@@ -0,0 +1,220 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from graphene.test import Client
+from graphql_jwt.shortcuts import get_token
+
+from budget.models import Category as CategoryModel
+from budget.models import Month as MonthModel
+from budget.models import Transaction as TransactionModel
+from checkBalance import pubsub
+from checkBalance.schema import schema
+from checkBalance.subscriptions import websocket_application
+from users import token_cache
+from users.models import CustomUser
+
+
+def execute_mutation(query, user):
+    context_value = RequestFactory().post('/graphql/')
+    context_value.user = user
+    return Client(schema).execute(query, context_value=context_value)
+
+
+class WebSocket:
+    '''Client of websocket_application'''
+
+    def __init__(self, path='/graphql/', subprotocols=('graphql-ws',)):
+        self.scope = {'type': 'websocket', 'path': path, 'subprotocols': list(subprotocols)}
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+
+    async def connect(self):
+        self.task = asyncio.ensure_future(
+            websocket_application(self.scope, self.incoming.get, self.outgoing.put))
+        await self.incoming.put({'type': 'websocket.connect'})
+        return await self.outgoing.get()
+
+    async def send(self, message):
+        await self.incoming.put({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def receive(self):
+        message = await asyncio.wait_for(self.outgoing.get(), timeout=5)
+        return json.loads(message['text']) if 'text' in message else message
+
+    async def disconnect(self):
+        await self.incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, timeout=5)
+
+
+@override_settings(SUBSCRIPTIONS_KEEP_ALIVE=0)
+class SubscriptionTest(TransactionTestCase):
+    '''Tests for graphql subscriptions over websockets'''
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email='user@test.com',
+            password='testpassword',
+            username='test_user'
+        )
+        self.month = MonthModel.objects.create(user=self.user, month=1, year=2021,
+                                               start_month_balance=100)
+        self.category = CategoryModel.objects.create(user=self.user, name='Food')
+
+    async def connect(self, token=None):
+        websocket = WebSocket()
+        accept = await websocket.connect()
+        self.assertEqual(accept, {'type': 'websocket.accept', 'subprotocol': 'graphql-ws'})
+
+        payload = {'authorization': 'Bearer %s' % token} if token else {}
+        await websocket.send({'type': 'connection_init', 'payload': payload})
+        return websocket
+
+    async def mutate(self, query):
+        result = await sync_to_async(execute_mutation)(query, self.user)
+        self.assertNotIn('errors', result)
+        return result
+
+    async def test_transaction_events(self):
+        websocket = await self.connect(get_token(self.user))
+        self.assertEqual(await websocket.receive(), {'type': 'connection_ack'})
+
+        await websocket.send({'type': 'start', 'id': '1', 'payload': {
+            'query': 'subscription { transactionsChanged { '
+                     'created { amount category { name } } updated { amount } deleted } }'}})
+
+        result = await self.mutate(
+            'mutation { createTransaction(amount: 10, group: Expense, month: %s, category: %s) '
+            '{ id } }' % (self.month.id, self.category.id))
+        id = result['data']['createTransaction']['id']
+
+        self.assertEqual(await websocket.receive(), {'type': 'data', 'id': '1', 'payload': {
+            'data': {'transactionsChanged': {
+                'created': [{'amount': 10, 'category': {'name': 'Food'}}],
+                'updated': [],
+                'deleted': []}}}})
+
+        await self.mutate('mutation { deleteTransaction(id: %s) { id } }' % id)
+
+        self.assertEqual(await websocket.receive(), {'type': 'data', 'id': '1', 'payload': {
+            'data': {'transactionsChanged': {'created': [], 'updated': [], 'deleted': [id]}}}})
+
+        await websocket.send({'type': 'stop', 'id': '1'})
+        self.assertEqual(await websocket.receive(), {'type': 'complete', 'id': '1'})
+
+        await websocket.disconnect()
+        self.assertEqual(pubsub.get_broker().subscribers, {})
+
+    async def test_month_summary(self):
+        websocket = await self.connect(get_token(self.user))
+        await websocket.receive()
+
+        await websocket.send({'type': 'start', 'id': '1', 'payload': {
+            'query': 'subscription { monthSummaryChanged(month: %s) { income closingBalance } }'
+                     % self.month.id}})
+
+        await self.mutate('mutation { createTransaction(amount: 10, group: Income, month: %s) '
+                          '{ id } }' % self.month.id)
+
+        self.assertEqual(await websocket.receive(), {'type': 'data', 'id': '1', 'payload': {
+            'data': {'monthSummaryChanged': {'income': 10, 'closingBalance': 110}}}})
+
+        await websocket.disconnect()
+
+    async def test_events_of_user_only(self):
+        user1 = await sync_to_async(CustomUser.objects.create_user)(
+            email='user1@test.com', password='testpassword', username='test_user1')
+        websocket = await self.connect(get_token(user1))
+        await websocket.receive()
+
+        await websocket.send({'type': 'start', 'id': '1', 'payload': {
+            'query': 'subscription { transactionsChanged { deleted } }'}})
+
+        await self.mutate('mutation { createTransaction(amount: 10, group: Income, month: %s) '
+                          '{ id } }' % self.month.id)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(websocket.outgoing.get(), timeout=0.2)
+
+        await websocket.disconnect()
+
+    async def test_unauthorized(self):
+        websocket = await self.connect()
+        self.assertEqual(await websocket.receive(), {'type': 'connection_ack'})
+
+        await websocket.send({'type': 'start', 'id': '1', 'payload': {
+            'query': 'subscription { transactionsChanged { deleted } }'}})
+
+        message = await websocket.receive()
+        self.assertEqual(message['payload']['errors'][0]['message'], 'Unauthorized.')
+        self.assertEqual(await websocket.receive(), {'type': 'complete', 'id': '1'})
+
+        await websocket.disconnect()
+
+    async def test_invalid_token(self):
+        websocket = await self.connect('invalid')
+
+        self.assertEqual(await websocket.receive(), {
+            'type': 'connection_error', 'payload': {'message': 'Error decoding signature'}})
+        self.assertEqual(await websocket.receive(), {'type': 'websocket.close', 'code': 1000})
+
+        await asyncio.wait_for(websocket.task, timeout=5)
+
+    async def test_wrong_subprotocol(self):
+        websocket = WebSocket(subprotocols=[])
+
+        self.assertEqual(await websocket.connect(), {'type': 'websocket.close', 'code': 1002})
+
+
+class PubSubTest(TransactionTestCase):
+    '''Tests for in-process broker'''
+
+    def test_publish(self):
+        broker = pubsub.InProcessBroker()
+        messages = []
+
+        unsubscribe = broker.subscribe('user:1', messages.append)
+        broker.publish('user:1', {'months': ['1']})
+        broker.publish('user:2', {'months': ['2']})
+        unsubscribe()
+        broker.publish('user:1', {'months': ['3']})
+
+        self.assertEqual(messages, [{'months': ['1']}])
+        self.assertEqual(broker.subscribers, {})
+
+    def test_published_after_commit(self):
+        user = CustomUser.objects.create_user(
+            email='user@test.com', password='testpassword', username='test_user')
+        month = MonthModel.objects.create(user=user, month=1, year=2021)
+        messages = []
+        unsubscribe = pubsub.subscribe(user.pk, messages.append)
+
+        execute_mutation('mutation { applyTransactionsUpdates(actions: ['
+                         '{type: create, data: {amount: 1, group: Income, month: %s}}]) '
+                         '{ errors { message } } }' % month.id, user)
+        unsubscribe()
+
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]['months'], [str(month.id)])
+        self.assertEqual(TransactionModel.objects.count(), 1)
+
+    def test_transaction_without_month(self):
+        user = CustomUser.objects.create_user(
+            email='user@test.com', password='testpassword', username='test_user')
+        month = MonthModel.objects.create(user=user, month=1, year=2021)
+        transaction = TransactionModel.objects.create(
+            user=user, month=month, amount=1, group='Income')
+        month.delete()
+        messages = []
+        unsubscribe = pubsub.subscribe(user.pk, messages.append)
+
+        execute_mutation('mutation { updateTransaction(id: %s, amount: 2) { id } }'
+                         % transaction.id, user)
+        unsubscribe()
+
+        self.assertEqual(messages, [{'created': [], 'updated': [str(transaction.id)],
+                                     'deleted': [], 'months': []}])
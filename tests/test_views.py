@@ -0,0 +1,615 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import tempfile
+import threading
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.urls import path
+from django.core.cache import cache
+from django.utils import timezone
+from graphql_jwt.shortcuts import get_token
+
+from budget import export
+from budget.models import Category as CategoryModel
+from budget.models import IdempotentRequest
+from budget.models import Month as MonthModel
+from budget.models import Plan as PlanModel
+from budget.models import Transaction as TransactionModel
+from users import token_cache
+from users.models import CustomUser
+from tests.base import UserSetUpMixin, UserTestCase
+from checkBalance import persisted_queries
+from checkBalance.backend import document_backend
+from budget.views import export_transactions
+from checkBalance.handlers import PooledStreamingASGIHandler
+from checkBalance.views import AsyncBudgetGraphQLView
+
+
+# urls of AsyncViewTest
+urlpatterns = [
+    path('graphql/', AsyncBudgetGraphQLView.as_view(), name='graphql'),
+    path('export/transactions/', export_transactions, name='export-transactions'),
+]
+
+
+class PersistedQueryTest(TestCase):
+    '''Tests for automatic persisted queries of graphql view'''
+
+    query = '{ __typename }'
+    sha256 = hashlib.sha256(query.encode()).hexdigest()
+
+    def setUp(self):
+        cache.clear()
+        persisted_queries.get_allowlist.cache_clear()
+
+    def tearDown(self):
+        persisted_queries.get_allowlist.cache_clear()
+
+    def post(self, data):
+        return self.client.post('/graphql/', json.dumps(data),
+                                content_type='application/json')
+
+    def extensions(self, sha256=None):
+        return {'persistedQuery': {'version': 1, 'sha256Hash': sha256 or self.sha256}}
+
+    def test_persisted_query_not_found(self):
+        response = self.post({'extensions': self.extensions()})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'errors': [{'message': 'PersistedQueryNotFound'}]})
+
+    def test_persisted_query_registered(self):
+        response = self.post({'query': self.query, 'extensions': self.extensions()})
+        self.assertEqual(response.json(), {'data': {'__typename': 'Query'}})
+
+        response = self.client.get('/graphql/', {
+            'extensions': json.dumps(self.extensions())})
+        self.assertEqual(response.json(), {'data': {'__typename': 'Query'}})
+
+    def test_persisted_query_hash_mismatch(self):
+        response = self.post({'query': self.query, 'extensions': self.extensions('0' * 64)})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_allowlist(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as allowlist:
+            json.dump({self.sha256: self.query}, allowlist)
+            allowlist.flush()
+
+            with override_settings(PERSISTED_QUERIES_ALLOWLIST=allowlist.name):
+                response = self.post({'extensions': self.extensions()})
+                self.assertEqual(response.json(), {'data': {'__typename': 'Query'}})
+
+                response = self.post({'query': '{ me { id } }'})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'errors': [{'message': 'Query is not allowed.'}]})
+
+
+class DocumentCacheTest(TestCase):
+    '''Tests for LRU cache of parsed and validated documents'''
+
+    def setUp(self):
+        document_backend.clear()
+
+    def post(self, query):
+        return self.client.post('/graphql/', json.dumps({'query': query}),
+                                content_type='application/json')
+
+    def test_document_reused(self):
+        self.post('{ __typename }')
+        response = self.post('{ __typename }')
+
+        self.assertEqual(response.json(), {'data': {'__typename': 'Query'}})
+        self.assertEqual(document_backend.hits, 1)
+        self.assertEqual(document_backend.misses, 1)
+
+    def test_invalid_document_not_cached(self):
+        response = self.post('{ unknownField }')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(document_backend.info()['size'], 0)
+
+    def test_size_limit(self):
+        size = document_backend.size
+        document_backend.size = 2
+
+        try:
+            for i in range(3):
+                self.post('{ alias%s: __typename }' % i)
+        finally:
+            document_backend.size = size
+
+        self.assertEqual(document_backend.info()['size'], 2)
+
+
+@override_settings(RESPONSE_CACHE_ALIAS='default')
+class ResponseCacheTest(UserTestCase):
+    '''Tests for per-user cache of query responses'''
+
+    months_query = '{ months { year month } }'
+
+    def setUp(self):
+        super().setUp()
+        self.user1 = CustomUser.objects.create_user(
+            email='user1@test.com',
+            password='testpassword',
+            username='test_user1'
+        )
+        MonthModel.objects.create(user=self.user, month=1, year=2021)
+
+    def post(self, query, user):
+        return self.client.post('/graphql/', json.dumps({'query': query}),
+                                content_type='application/json',
+                                HTTP_AUTHORIZATION='Bearer %s' % get_token(user))
+
+    def test_query_response_cached(self):
+        response = self.post(self.months_query, self.user)
+        self.assertEqual(response.json(), {'data': {'months': [{'year': 2021, 'month': 1}]}})
+
+        with self.assertNumQueries(0):
+            # token user is cached too
+            response = self.post(self.months_query, self.user)
+        self.assertEqual(response.json(), {'data': {'months': [{'year': 2021, 'month': 1}]}})
+
+        response = self.post(self.months_query, self.user1)
+        self.assertEqual(response.json(), {'data': {'months': []}})
+
+    @override_settings(RESPONSE_CACHE_ALIAS=None)
+    def test_no_shared_cache(self):
+        self.post(self.months_query, self.user)
+        MonthModel.objects.create(user=self.user, month=2, year=2021)
+
+        # other workers would not see the new data version
+        response = self.post(self.months_query, self.user)
+        self.assertEqual(len(response.json()['data']['months']), 2)
+
+        response = self.client.get('/graphql/', {'query': self.months_query},
+                                   HTTP_AUTHORIZATION='Bearer %s' % self.token)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_mutation_invalidates_cache(self):
+        self.post(self.months_query, self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post('mutation { createMonth(year:2021, month:2) { id } }', self.user)
+
+        response = self.post(self.months_query, self.user)
+        self.assertEqual(len(response.json()['data']['months']), 2)
+
+
+@override_settings(RESPONSE_CACHE_ALIAS='default')
+class ETagTest(UserTestCase):
+    '''Tests for ETag of GET queries'''
+
+    months_query = '{ months { year month } }'
+
+    def get(self, **headers):
+        return self.client.get('/graphql/', {'query': self.months_query},
+                               HTTP_AUTHORIZATION='Bearer %s' % self.token, **headers)
+
+    def test_not_modified(self):
+        response = self.get()
+        etag = response['ETag']
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_changes_with_data_version(self):
+        etag = self.get()['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/graphql/',
+                             json.dumps({'query': 'mutation { createMonth(year:2021, month:2) { id } }'}),
+                             content_type='application/json',
+                             HTTP_AUTHORIZATION='Bearer %s' % self.token)
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['data']['months']), 1)
+
+    def test_no_etag_for_errors(self):
+        response = self.client.get('/graphql/', {'query': self.months_query})
+
+        self.assertFalse(response.has_header('ETag'))
+
+
+@override_settings(RESPONSE_CACHE_ALIAS='default')
+class BatchTest(UserTestCase):
+    '''Tests for multiple operations in one POST'''
+
+    def post(self, data):
+        return self.client.post('/graphql/', json.dumps(data),
+                                content_type='application/json',
+                                HTTP_AUTHORIZATION='Bearer %s' % self.token)
+
+    def test_batch(self):
+        response = self.post([
+            {'query': '{ me { email } }'},
+            {'query': 'query Months { months { id } }', 'operationName': 'Months'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['data'] for result in response.json()], [
+            {'me': {'email': 'user@test.com'}},
+            {'months': []}])
+
+    def test_cached_response_outside_batch(self):
+        self.post([{'query': '{ me { email } }'}])
+        response = self.post({'query': '{ me { email } }'})
+
+        self.assertEqual(response.json(), {'data': {'me': {'email': 'user@test.com'}}})
+
+    @override_settings(RESPONSE_CACHE_ALIAS=None)
+    def test_loaders_not_shared(self):
+        category = CategoryModel.objects.create(user=self.user, name='Food')
+        month = MonthModel.objects.create(user=self.user, month=1, year=2021)
+        plan = PlanModel.objects.create(user=self.user, category=category, month=month,
+                                        planned_amount=100)
+        query = {'query': '{ plan(id: %s) { spent } }' % plan.id}
+        mutation = ('mutation { createTransaction(amount: 40, group: Expense, '
+                    'month: %s, category: %s) { id } }' % (month.id, category.id))
+
+        response = self.post([query, {'query': mutation}, query])
+
+        self.assertEqual([result['data'] for result in response.json()][2],
+                         {'plan': {'spent': 40}})
+
+    def test_batch_size_limit(self):
+        response = self.post([{'query': '{ __typename }'}] * 21)
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_empty_batch(self):
+        response = self.post([])
+
+        self.assertEqual(response.status_code, 400)
+
+
+class IdempotencyTest(UserTestCase):
+    '''Tests for mutations with idempotency key'''
+
+    mutation = 'mutation { createCategory(name: "Food") { id name } }'
+
+    def setUp(self):
+        super().setUp()
+        self.month = MonthModel.objects.create(user=self.user, month=1, year=2021)
+
+    def post(self, data, **headers):
+        return self.client.post('/graphql/', json.dumps(data),
+                                content_type='application/json',
+                                HTTP_AUTHORIZATION='Bearer %s' % self.token,
+                                **headers)
+
+    def test_header_replay(self):
+        response = self.post({'query': self.mutation}, HTTP_IDEMPOTENCY_KEY='key')
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+
+        # category is deleted, repeated request should not create it again
+        CategoryModel.objects.all().delete()
+        replay = self.post({'query': self.mutation}, HTTP_IDEMPOTENCY_KEY='key')
+
+        self.assertEqual(replay.json(), response.json())
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertFalse(CategoryModel.objects.exists())
+
+    def test_argument_key(self):
+        query = '''
+            mutation Create($key: String) {
+                createTransaction(amount: 10, group: Expense, month: %s,
+                                  idempotencyKey: $key) { id }
+            }
+        ''' % self.month.id
+        data = {'query': query, 'variables': {'key': 'key'}}
+
+        first = self.post(data)
+        second = self.post(data)
+
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(TransactionModel.objects.count(), 1)
+
+        self.post(dict(data, variables={'key': 'other'}))
+        self.assertEqual(TransactionModel.objects.count(), 2)
+
+    def test_key_reused_for_another_request(self):
+        self.post({'query': self.mutation}, HTTP_IDEMPOTENCY_KEY='key')
+        response = self.post({'query': 'mutation { createCategory(name: "Rent") { id } }'},
+                             HTTP_IDEMPOTENCY_KEY='key')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(CategoryModel.objects.filter(name='Rent').exists())
+
+    def test_key_stored_in_database(self):
+        response = self.post({'query': self.mutation}, HTTP_IDEMPOTENCY_KEY='key')
+        cache.clear()
+        CategoryModel.objects.all().delete()
+        replay = self.post({'query': self.mutation}, HTTP_IDEMPOTENCY_KEY='key')
+
+        self.assertEqual(replay.json(), response.json())
+        self.assertFalse(CategoryModel.objects.exists())
+        self.assertEqual(IdempotentRequest.objects.get(user=self.user).response,
+                         json.dumps(response.json(), separators=(',', ':')))
+
+    def test_expired_key(self):
+        self.post({'query': self.mutation}, HTTP_IDEMPOTENCY_KEY='key')
+        IdempotentRequest.objects.update(created_at=timezone.now() - datetime.timedelta(days=2))
+        CategoryModel.objects.all().delete()
+        response = self.post({'query': self.mutation}, HTTP_IDEMPOTENCY_KEY='key')
+
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertTrue(CategoryModel.objects.exists())
+        self.assertEqual(IdempotentRequest.objects.count(), 1)
+
+    def test_errors_not_stored(self):
+        query = 'mutation { updateMonth(id: "x", startMonthBalance: 1) { id } }'
+        response = self.post({'query': query}, HTTP_IDEMPOTENCY_KEY='key')
+
+        self.assertIn('errors', response.json())
+        self.assertFalse(IdempotentRequest.objects.exists())
+
+        # key was rolled back with the failed mutation and can be used again
+        retry = self.post({'query': self.mutation}, HTTP_IDEMPOTENCY_KEY='key')
+
+        self.assertEqual(retry.status_code, 200)
+        self.assertTrue(CategoryModel.objects.exists())
+
+    def test_query_ignores_key(self):
+        self.post({'query': '{ categories { id } }'}, HTTP_IDEMPOTENCY_KEY='key')
+        response = self.post({'query': self.mutation}, HTTP_IDEMPOTENCY_KEY='key')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(CategoryModel.objects.filter(name='Food').exists())
+
+    def test_users_have_own_keys(self):
+        self.post({'query': self.mutation}, HTTP_IDEMPOTENCY_KEY='key')
+        user1 = CustomUser.objects.create_user(
+            email='user1@test.com',
+            password='testpassword',
+            username='test_user1'
+        )
+        self.client.post('/graphql/', json.dumps({'query': self.mutation}),
+                         content_type='application/json',
+                         HTTP_AUTHORIZATION='Bearer %s' % get_token(user1),
+                         HTTP_IDEMPOTENCY_KEY='key')
+
+        self.assertTrue(CategoryModel.objects.filter(user=user1).exists())
+
+
+class JSONWebTokenAuthenticationTest(UserTestCase):
+    '''Tests for authentication of JWT once per request'''
+
+    def post(self, token):
+        return self.client.post('/graphql/', json.dumps({'query': '{ me { email } }'}),
+                                content_type='application/json',
+                                HTTP_AUTHORIZATION='Bearer %s' % token)
+
+    def test_user_loaded_once(self):
+        with self.assertNumQueries(1):
+            response = self.post(self.token)
+
+        self.assertEqual(response.json(), {'data': {'me': {'email': 'user@test.com'}}})
+
+    def test_invalid_token(self):
+        response = self.post('invalid')
+
+        self.assertEqual(response.json(), {'errors': [{'message': 'Error decoding signature'}]})
+
+
+class TokenUserCacheTest(UserTestCase):
+    '''Tests for cache of token users'''
+
+    def post(self):
+        return self.client.post('/graphql/', json.dumps({'query': '{ me { email username } }'}),
+                                content_type='application/json',
+                                HTTP_AUTHORIZATION='Bearer %s' % self.token)
+
+    def test_user_cached(self):
+        self.post()
+
+        with self.assertNumQueries(0):
+            user = token_cache.get_user(self.token)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, 'user@test.com')
+
+        cache.clear()
+        with self.assertNumQueries(0):
+            response = self.post()
+        self.assertEqual(response.json(),
+                         {'data': {'me': {'email': 'user@test.com', 'username': 'test_user'}}})
+
+    def test_password_change_invalidates(self):
+        self.post()
+
+        self.user.set_password('newpassword')
+        self.user.save()
+
+        self.assertIsNone(token_cache.get_user(self.token))
+
+    def test_profile_save_keeps_cache(self):
+        self.post()
+
+        self.user.save()
+
+        self.assertIsNotNone(token_cache.get_user(self.token))
+
+    @override_settings(JWT_USER_CACHE_TTL=0)
+    def test_ttl(self):
+        self.post()
+
+        self.assertIsNone(token_cache.get_user(self.token))
+
+    @override_settings(JWT_USER_CACHE_ALIAS='default')
+    def test_shared_cache(self):
+        self.post()
+        self.assertIsNotNone(token_cache.get_user(self.token))
+
+        self.user.set_password('newpassword')
+        self.user.save()
+
+        self.assertIsNone(token_cache.get_user(self.token))
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncViewTest(UserSetUpMixin, TransactionTestCase):
+    '''Tests for graphql view served through ASGI handler'''
+
+    def setUp(self):
+        super().setUp()
+        MonthModel.objects.create(user=self.user, month=1, year=2021)
+        self.client = AsyncClient()
+
+    async def post(self, query, token=None):
+        # AsyncClient takes raw header names
+        headers = {'authorization': 'Bearer %s' % token} if token else {}
+        return await self.client.post('/graphql/', json.dumps({'query': query}),
+                                      content_type='application/json', **headers)
+
+    async def test_query(self):
+        response = await self.post('{ months { year month } }', self.token)
+
+        self.assertEqual(response.json(), {'data': {'months': [{'year': 2021, 'month': 1}]}})
+
+    async def test_unauthorized(self):
+        response = await self.post('{ months { year month } }')
+
+        self.assertEqual(response.json()['errors'][0]['message'], 'Unauthorized.')
+
+    async def test_executed_in_pool(self):
+        threads = []
+        execute_graphql_request = AsyncBudgetGraphQLView.execute_graphql_request
+
+        def execute(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return execute_graphql_request(*args, **kwargs)
+
+        with mock.patch.object(AsyncBudgetGraphQLView, 'execute_graphql_request', execute):
+            await self.post('{ months { year } }')
+
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('graphql'))
+
+    async def request(self, path, query_string=''):
+        '''Sends GET request through ASGI handler of asgi.py, returns (status, body)'''
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await PooledStreamingASGIHandler()({
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query_string.encode(),
+            'root_path': '',
+            'headers': [(b'authorization', ('Bearer %s' % self.token).encode())],
+            'client': ('127.0.0.1', 10000),
+            'server': ('testserver', 80),
+        }, receive, send)
+
+        return messages[0]['status'], b''.join(message.get('body', b'') for message in messages[1:])
+
+    async def test_export(self):
+        status, body = await self.request('/export/transactions/')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body.decode().splitlines(),
+                         ['id,date,group,amount,description,category,year,month'])
+
+    @override_settings(EXPORT_CHUNK_SIZE=1)
+    async def test_request_during_export(self):
+        await sync_to_async(TransactionModel.objects.bulk_create)([
+            TransactionModel(user=self.user, amount=amount, group='Income') for amount in (1, 2, 3)])
+        fetching = threading.Event()
+        release = threading.Event()
+        fetch_chunk = export.fetch_chunk
+
+        def blocked_fetch_chunk(user, after, size):
+            if after is not None and not release.is_set():
+                fetching.set()
+                release.wait(5)
+            return fetch_chunk(user, after, size)
+
+        with mock.patch.object(export, 'fetch_chunk', blocked_fetch_chunk):
+            exporting = asyncio.ensure_future(self.request('/export/transactions/'))
+
+            while not fetching.is_set():
+                await asyncio.sleep(0.01)
+
+            # export waits for its second chunk in thread pool, event loop is free
+            status, body = await asyncio.wait_for(
+                self.request('/graphql/', 'query={ months { year } }'), 2)
+            self.assertEqual(json.loads(body), {'data': {'months': [{'year': 2021}]}})
+            self.assertFalse(exporting.done())
+
+            release.set()
+            status, body = await exporting
+
+        self.assertEqual(len(body.decode().splitlines()), 4)
+
+
+class ExportTest(UserTestCase):
+    '''Tests for streaming export of transactions'''
+
+    def setUp(self):
+        super().setUp()
+        month = MonthModel.objects.create(user=self.user, month=1, year=2021)
+        category = CategoryModel.objects.create(user=self.user, name='Food')
+        self.transactions = [
+            TransactionModel.objects.create(user=self.user, month=month, category=category,
+                                            group='Expense', amount=amount,
+                                            description='Item, %s' % amount)
+            for amount in (10, 20, 30)
+        ]
+
+    def get(self, format='csv'):
+        return self.client.get('/export/transactions/', {'format': format},
+                               HTTP_AUTHORIZATION='Bearer %s' % self.token)
+
+    def test_csv(self):
+        response = self.get()
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,date,group,amount,description,category,year,month')
+        self.assertEqual(lines[1], '%s,%s,Expense,10,"Item, 10",Food,2021,1'
+                         % (self.transactions[0].id, self.transactions[0].created_at))
+        self.assertEqual(len(lines), 4)
+
+    def test_ndjson(self):
+        response = self.get('ndjson')
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['amount'] for row in rows], [10, 20, 30])
+        self.assertEqual(rows[0]['category'], 'Food')
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_query_per_chunk(self):
+        response = self.get()
+
+        with self.assertNumQueries(2):
+            chunks = list(response.streaming_content)
+
+        # header and two chunks of rows
+        self.assertEqual(len(chunks), 3)
+
+    def test_unauthorized(self):
+        response = self.client.get('/export/transactions/')
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.get('xml').status_code, 400)
@@ -0,0 +1,86 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from graphql_jwt.middleware import JSONWebTokenMiddleware
+from graphql_jwt.shortcuts import get_token
+
+from checkBalance.middleware import JSONWebTokenAuthenticationMiddleware
+from checkBalance.schema import schema
+from users.models import CustomUser
+
+
+QUERY = '''
+    query {
+        transactions {
+            id
+            amount
+            group
+            description
+            createdAt
+        }
+    }
+'''
+
+
+class FieldCounter:
+    '''Graphene middleware counting resolved fields'''
+
+    def __init__(self):
+        self.count = 0
+
+    def resolve(self, next, root, info, **kwargs):
+        self.count += 1
+        return next(root, info, **kwargs)
+
+
+class Command(BaseCommand):
+    help = ('Compares per-field cost of a list query authenticated by graphql_jwt '
+            'middleware on every field and by JSONWebTokenAuthenticationMiddleware '
+            'once per request. Only reads data of given user.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='User whose transactions are queried.')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--query', default=QUERY)
+
+    def handle(self, *args, **options):
+        user = CustomUser.objects.get(email=options['email'])
+        token = get_token(user)
+        query = options['query']
+
+        def request():
+            request = RequestFactory().post('/graphql/', HTTP_AUTHORIZATION='Bearer %s' % token)
+            request.user = AnonymousUser()
+            return request
+
+        def per_field(request):
+            return schema.execute(query, context_value=request,
+                                  middleware=[JSONWebTokenMiddleware()])
+
+        def per_request(request):
+            JSONWebTokenAuthenticationMiddleware(lambda request: None)(request)
+            return schema.execute(query, context_value=request)
+
+        counter = FieldCounter()
+        context = request()
+        JSONWebTokenAuthenticationMiddleware(lambda request: None)(context)
+        result = schema.execute(query, context_value=context, middleware=[counter])
+        if result.errors:
+            self.stderr.write(str(result.errors))
+            return
+
+        self.stdout.write('%s fields per request' % counter.count)
+
+        for name, execute in (('per field', per_field), ('per request', per_request)):
+            elapsed = 0
+            for _ in range(options['repeat']):
+                context = request()
+                start = time.perf_counter()
+                execute(context)
+                elapsed += time.perf_counter() - start
+
+            per_request_ms = elapsed * 1000 / options['repeat']
+            self.stdout.write('%s: %.2f ms per request, %.2f us per field' % (
+                name, per_request_ms, per_request_ms * 1000 / max(counter.count, 1)))
@@ -1,5 +1,7 @@
 import graphene
 
+from checkBalance.response_cache import bumps_data_version
+
 from .schema import User
 from .models import CustomUser
 
@@ -12,6 +14,7 @@ class Register(graphene.Mutation):
         password = graphene.String(required=True)
         email = graphene.String(required=True)
 
+    @bumps_data_version
     def mutate(self, info, username, password, email):
         user = CustomUser.objects.create_user(
             username=username,
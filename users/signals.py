@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import CustomUser
+from .token_cache import invalidate_user
+
+
+@receiver(pre_save, sender=CustomUser)
+def invalidate_cached_tokens_on_password_change(sender, instance, **kwargs):
+    # set_password() keeps raw password in _password until save
+    if instance.pk is not None and instance._password is not None:
+        invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_tokens_on_delete(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
@@ -0,0 +1,130 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import CustomUser
+
+
+USER_FIELDS = ['id', 'email', 'username', 'avatar']
+
+
+class TTLCache:
+    '''In-process cache with expiration time per key'''
+
+    def __init__(self, size):
+        self.size = size
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+
+            if item is None:
+                return None
+
+            value, expires_at = item
+
+            if expires_at <= time.time():
+                del self.items[key]
+                return None
+
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            if len(self.items) >= self.size:
+                self.delete_expired()
+            if len(self.items) >= self.size:
+                # still full, dropping the oldest half
+                for old_key in list(self.items)[:self.size // 2]:
+                    del self.items[old_key]
+
+            self.items[key] = (value, time.time() + timeout)
+
+    def delete_expired(self):
+        now = time.time()
+        for key in [key for key, (_, expires_at) in self.items.items() if expires_at <= now]:
+            del self.items[key]
+
+    def delete_where(self, condition):
+        with self.lock:
+            for key in [key for key, (value, _) in self.items.items() if condition(value)]:
+                del self.items[key]
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+local_cache = TTLCache(settings.JWT_USER_CACHE_SIZE)
+
+
+def get_shared_cache():
+    alias = settings.JWT_USER_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def signature(token):
+    return 'jwt-user:' + token.rsplit('.', 1)[-1]
+
+
+def generation_key(user_id):
+    return 'jwt-user-generation:%s' % user_id
+
+
+def get_user(token):
+    '''Returns user of token from cache or None'''
+    shared_cache = get_shared_cache()
+
+    if shared_cache is None:
+        data = local_cache.get(signature(token))
+    else:
+        data = shared_cache.get(signature(token))
+        if data is not None and data['generation'] != shared_cache.get(generation_key(data['id']), 0):
+            data = None
+
+    if data is None:
+        return None
+
+    return CustomUser.from_db('default', USER_FIELDS, [data[field] for field in USER_FIELDS])
+
+
+def set_user(token, user, payload):
+    '''Keeps user of token until cache TTL or token expiration'''
+    timeout = settings.JWT_USER_CACHE_TTL
+
+    if 'exp' in payload:
+        timeout = min(timeout, payload['exp'] - time.time())
+
+    if timeout <= 0:
+        return
+
+    data = {field: getattr(user, field) for field in USER_FIELDS}
+    shared_cache = get_shared_cache()
+
+    if shared_cache is None:
+        local_cache.set(signature(token), data, timeout)
+    else:
+        data['generation'] = shared_cache.get(generation_key(user.pk), 0)
+        shared_cache.set(signature(token), data, timeout)
+
+
+def invalidate_user(user_id):
+    '''Drops cached tokens of user, e.g. after password change'''
+    shared_cache = get_shared_cache()
+
+    if shared_cache is None:
+        local_cache.delete_where(lambda data: data['id'] == user_id)
+        return
+
+    try:
+        shared_cache.incr(generation_key(user_id))
+    except ValueError:
+        shared_cache.set(generation_key(user_id), 1, timeout=None)
+
+
+def clear():
+    local_cache.clear()